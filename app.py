@@ -4,9 +4,17 @@ import pandas as pd  # For handling data (though not used much here)
 import os  # Helps with file paths
 import requests  # Can be used to make web requests (not used in this code)
 import json  # Helps to work with JSON data
-from flask import Flask, request, jsonify, render_template, send_from_directory  # Flask web framework
+from flask import Flask, Response, g, request, jsonify, render_template, send_from_directory  # Flask web framework
 from datetime import datetime  # For working with dates and time (not used here)
 import re  # Regular expressions (not used here)
+import threading  # Lets the model registry be watched in the background
+import model_registry  # Versioned model files that can be swapped without a restart
+from similar_plantings import build_similar_index, SIMILAR_INDEX_FILE, DEFAULT_K, MAX_K  # Nearest historical plantings lookup
+import queue  # Used to hand sensor updates to streaming clients
+from sensor_subscriptions import SubscriptionRegistry, soil_moisture_percent  # Plots that follow a sensor
+from region_resolver import RegionResolver, REGIONS_FILE  # Finds the region of Maharashtra for a lat/lon
+from sensor_aggregates import SensorAggregator  # Rolling sensor statistics and anomaly flags
+from shard_cache import ShardCache, SHARDS_DIR, DEFAULT_MEMORY_BUDGET_MB  # Per-region model shards
 
 # Get the current directory of the running file
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,35 +29,253 @@ app = Flask(__name__,
             static_url_path='/static',
             template_folder=template_folder)
 
+# Requests being handled right now, counted inside the app so load tests see real worker usage.
+# seconds_at_in_flight adds up how long the app spent with 0, 1, 2, ... requests in progress.
+server_stats_lock = threading.Lock()
+server_stats = {'requests': 0, 'in_flight': 0, 'peak_in_flight': 0, 'seconds_at_in_flight': {}}
+server_stats_changed_at = [datetime.now().timestamp()]
+
+def update_in_flight(change):
+    with server_stats_lock:
+        now = datetime.now().timestamp()
+        level = server_stats['in_flight']
+        times = server_stats['seconds_at_in_flight']
+        times[level] = times.get(level, 0.0) + now - server_stats_changed_at[0]
+        server_stats_changed_at[0] = now
+        server_stats['in_flight'] = level + change
+        if change > 0:
+            server_stats['requests'] += 1
+            server_stats['peak_in_flight'] = max(server_stats['peak_in_flight'], level + change)
+
+@app.before_request
+def count_request_start():
+    # The stats endpoint itself is left out so polling it doesn't change what it reports
+    if request.endpoint != 'get_server_stats':
+        g.counted_in_flight = True
+        update_in_flight(1)
+
+@app.teardown_request
+def count_request_end(error=None):
+    if g.pop('counted_in_flight', False):
+        update_in_flight(-1)
+
 # This function creates a complete path to access files
 def get_absolute_path(relative_path):
     return os.path.join(current_dir, relative_path)
 
-# Load the machine learning models and encoders that were saved earlier
-with open(get_absolute_path('agricultural_models.pkl'), 'rb') as f:
-    models = pickle.load(f)
+# Addresses of the outside services; they can be pointed elsewhere (e.g. at the fakes in loadtest/)
+OPENWEATHER_API_URL = os.environ.get('OPENWEATHER_API_URL', 'https://api.openweathermap.org/data/2.5/weather')
+GEMINI_API_URL = os.environ.get('GEMINI_API_URL',
+                                'https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent')
+# Training data, used to build the similar plantings index when it wasn't saved with the models
+DATASET_FILE = 'Maharashtra_Agriculture_Realistic.xlsx'
+# Folder where plant_monitor.py writes plant_data.json / plant_data.csv
+sensor_data_dir = os.environ.get('SENSOR_DATA_DIR', get_absolute_path('sensorData'))
+
+# Load the machine learning models and encoders that were saved earlier.
+# If ml_model.py has published versions into the model registry, serve the current one,
+# otherwise fall back to the single files in the project folder.
+registry_dir = os.environ.get('MODEL_REGISTRY_DIR', get_absolute_path(model_registry.REGISTRY_DIR_NAME))
+
+# Memory the per-region model shards may take in this worker
+shard_memory_budget = float(os.environ.get('SHARD_MEMORY_BUDGET_MB', DEFAULT_MEMORY_BUDGET_MB)) * 2**20
+
+def attach_shard_cache(bundle):
+    """Give a bundle its own cache of the shards saved next to its models"""
+    bundle['shards'] = ShardCache(os.path.join(bundle['path'], SHARDS_DIR), shard_memory_budget,
+                                  bundle.get('golden_inputs'))
+    return bundle
+
+def validate_bundle(bundle):
+    """Check a loaded version's models and read its shard manifest; raises ValueError if anything is broken
+
+    Shards are not loaded here: each one is checked against its golden inputs the first time it is used.
+    """
+    model_registry.validate_bundle(bundle)
+    attach_shard_cache(bundle)
+
+def load_initial_bundle():
+    # Try CURRENT first, then the versions served before it (newest first), so every worker
+    # ends up on the same registry version instead of the files in the project folder
+    current = model_registry.get_current_version(registry_dir)
+    candidates = [current] if current else []
+    for version in reversed(model_registry.get_history(registry_dir)):
+        if version not in candidates and version in model_registry.list_versions(registry_dir):
+            candidates.append(version)
+    for version in candidates:
+        try:
+            bundle = model_registry.load_version(registry_dir, version)
+            validate_bundle(bundle)
+            if version != current:
+                app.logger.error(f"Model version {current} is not usable, serving {version} from the history")
+            return bundle
+        except Exception as e:
+            app.logger.error(f"Could not load model version {version}: {str(e)}")
+    if candidates:
+        app.logger.error("No model version in the registry is usable, using the default files")
+
+    with open(get_absolute_path('agricultural_models.pkl'), 'rb') as f:
+        models = pickle.load(f)
+    # Load unique dropdown values for crop name, region, etc.
+    with open(get_absolute_path('unique_values.pkl'), 'rb') as f:
+        unique_values = pickle.load(f)
+    return attach_shard_cache({'version': None, 'path': current_dir, 'models': models,
+                               'unique_values': unique_values, 'golden_inputs': []})
+
+# The bundle being served right now. Request handlers read it once into a local variable
+# so a swap in the middle of a request can never mix two model versions.
+active_bundle = load_initial_bundle()
 
 # Extract individual models and encoders from the dictionary
-seed_size_model = models['seed_size_model']
-sowing_depth_model = models['sowing_depth_model']
-spacing_model = models['spacing_model']
-label_encoders = models['label_encoders']
+seed_size_model = active_bundle['models']['seed_size_model']
+sowing_depth_model = active_bundle['models']['sowing_depth_model']
+spacing_model = active_bundle['models']['spacing_model']
+label_encoders = active_bundle['models']['label_encoders']
+unique_values = active_bundle['unique_values']
+
+# Functions called with the new bundle after every swap, used to clear caches built from the old models
+model_swap_listeners = []
+model_swap_lock = threading.Lock()
+
+def register_model_swap_listener(listener):
+    model_swap_listeners.append(listener)
+    return listener
+
+def swap_models(bundle):
+    """Replace the models being served with an already validated bundle"""
+    global active_bundle, seed_size_model, sowing_depth_model, spacing_model, label_encoders, unique_values
+    # Shards of the old version are dropped together with it
+    if 'shards' not in bundle:
+        attach_shard_cache(bundle)
+    with model_swap_lock:
+        models = bundle['models']
+        seed_size_model = models['seed_size_model']
+        sowing_depth_model = models['sowing_depth_model']
+        spacing_model = models['spacing_model']
+        label_encoders = models['label_encoders']
+        unique_values = bundle['unique_values']
+        # A single assignment, so readers see either the old bundle or the new one
+        active_bundle = bundle
+        for listener in model_swap_listeners:
+            try:
+                listener(bundle)
+            except Exception as e:
+                app.logger.error(f"Model swap listener error: {str(e)}")
+    app.logger.info(f"Now serving model version {bundle['version']}")
+
+# Watch the registry in the background and hot-swap whenever CURRENT points somewhere new
+registry_watcher = model_registry.RegistryWatcher(
+    registry_dir,
+    on_load=swap_models,
+    loaded_version=active_bundle['version'],
+    poll_seconds=float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 5)),
+    logger=app.logger,
+    validate=validate_bundle
+)
+registry_watcher.start()
 
-# Load unique dropdown values for crop name, region, etc.
-with open(get_absolute_path('unique_values.pkl'), 'rb') as f:
-    unique_values = pickle.load(f)
+# The similar plantings index that belongs to the served model version, loaded on first use
+similar_index_cache = {}
+similar_index_lock = threading.Lock()
 
-# This will hold detailed information about soil types (can be used in frontend)
-soil_types = unique_values['Soil Type']
+def get_similar_index():
+    """Return the similar plantings index for the current models, or None if it can't be built"""
+    bundle = active_bundle
+    key = bundle['version']
+    if key not in similar_index_cache:
+        with similar_index_lock:
+            if key not in similar_index_cache:
+                index_path = os.path.join(bundle['path'], SIMILAR_INDEX_FILE)
+                index = None
+                if os.path.exists(index_path):
+                    with open(index_path, 'rb') as f:
+                        index = pickle.load(f)
+                elif os.path.exists(get_absolute_path(DATASET_FILE)):
+                    # Not saved with these models (e.g. trained before the index existed), so build it from the workbook
+                    index = build_similar_index(pd.read_excel(get_absolute_path(DATASET_FILE)))
+                similar_index_cache.clear()
+                similar_index_cache[key] = index
+    return similar_index_cache.get(key)
+
+@register_model_swap_listener
+def clear_similar_index_cache(bundle):
+    similar_index_cache.clear()
+
+def shard_key(bundle, inputs):
+    """The shard a request belongs to (e.g. its region), or None when the bundle has no shards"""
+    field = bundle['shards'].input_field
+    return inputs.get(field) if field else None
+
+def models_for_shard(bundle, key):
+    """The shard's models with the shared encoders, or the global models if there is no shard for key"""
+    if key is None:
+        return bundle['models'], None
+    shard = bundle['shards'].get(key)
+    if shard is None:
+        return bundle['models'], None
+    return dict(shard, label_encoders=bundle['shards'].manifest['label_encoders']), key
+
+def predict_batch(inputs):
+    """Predict seed size, depth and spacing for many form-style inputs with one call per model and shard"""
+    bundle = active_bundle
+    groups = {}
+    for position, item in enumerate(inputs):
+        groups.setdefault(shard_key(bundle, item), []).append(position)
+
+    results = [None] * len(inputs)
+    for key, positions in groups.items():
+        models, _ = models_for_shard(bundle, key)
+        predictions = model_registry.predict_with_models(models, [inputs[p] for p in positions])
+        for position, result in zip(positions, predictions):
+            result['sowing_depth'] = round(result['sowing_depth'], 2)
+            result['spacing'] = round(result['spacing'], 2)
+            results[position] = result
+    return results
+
+# Plots subscribed to a sensor device, kept up to date as readings arrive
+sensor_subscriptions = SubscriptionRegistry(predict_batch)
+
+# Device id used for readings fetched by sensorData/plant_monitor.py
+DEFAULT_SENSOR_DEVICE = 'plant-monitor'
+
+@register_model_swap_listener
+def refresh_sensor_subscriptions(bundle):
+    sensor_subscriptions.invalidate()
+
+# Sliding-window statistics per sensor device, kept in memory
+sensor_aggregates = SensorAggregator()
+
+def record_sensor_reading(device_id, reading):
+    """Add a reading to the rolling statistics and, unless it looks faulty, update subscribed plots"""
+    anomalies = sensor_aggregates.add(device_id, reading)
+    if anomalies is None:
+        # Same reading as last time, nothing new to do
+        return [], []
+    # Only the values the models use matter here; a missing humidity doesn't stop an update
+    faulty = {field for anomaly in anomalies if anomaly['type'] != 'spike' for field in anomaly['fields']}
+    if faulty & {'temperature', 'soil_moisture'}:
+        return [], anomalies
+    updates = sensor_subscriptions.ingest(device_id, float(reading['temperature']),
+                                          soil_moisture_percent(reading['soil_moisture']))
+    return updates, anomalies
+
+# Region and district polygons, indexed once so lat/lon lookups don't scan every polygon
+region_resolver = RegionResolver.from_file(get_absolute_path(REGIONS_FILE))
+
+def resolve_region(lat, lon):
+    """Return the Region value (as used by the models) for a point, or None outside Maharashtra"""
+    feature = region_resolver.resolve(lat, lon)
+    return feature['region'] if feature else None
 
 # Home page route
 @app.route('/')
 def home():
+    values = active_bundle['unique_values']
     return render_template('index.html',
-                           crops=unique_values['Crop Name'],
-                           regions=unique_values['Region'],
-                           seasons=unique_values['Season'],
-                           soil_types=unique_values['Soil Type'],
+                           crops=values['Crop Name'],
+                           regions=values['Region'],
+                           seasons=values['Season'],
+                           soil_types=values['Soil Type'],
                            soil_data=soil_types)
 
 # Route to serve static files (like CSS, JS, images)
@@ -63,30 +289,44 @@ def predict():
     try:
         # Get input values from the HTML form
         crop_name = request.form['crop_name']
-        region = request.form['region']
+        region = request.form.get('region')
         season = request.form['season']
         temperature = float(request.form.get('temperature', 0))  # default to 0 if missing
         moisture = float(request.form.get('moisture', 0))  # default to 0 if missing
         soil_type = request.form['soil_type']
         soil_ph = float(request.form['soil_ph'])
 
+        # Work out the region from the plot's coordinates if it wasn't chosen
+        if not region and request.form.get('lat') and request.form.get('lon'):
+            region = resolve_region(request.form['lat'], request.form['lon'])
+        if not region:
+            raise ValueError("Region is required (or lat/lon inside Maharashtra)")
+
+        # Take one consistent set of models for the whole request
+        bundle = active_bundle
+        # Use the region's shard when there is one, otherwise the global models
+        inputs = {'crop_name': crop_name, 'region': region, 'season': season, 'temperature': temperature,
+                  'moisture': moisture, 'soil_type': soil_type, 'soil_ph': soil_ph}
+        models, shard = models_for_shard(bundle, shard_key(bundle, inputs))
+        encoders = models['label_encoders']
+
         # Convert text inputs to numbers using label encoders
-        crop_name_encoded = label_encoders['Crop Name'].transform([crop_name])[0]
-        region_encoded = label_encoders['Region'].transform([region])[0]
-        season_encoded = label_encoders['Season'].transform([season])[0]
-        soil_type_encoded = label_encoders['Soil Type'].transform([soil_type])[0]
+        crop_name_encoded = encoders['Crop Name'].transform([crop_name])[0]
+        region_encoded = encoders['Region'].transform([region])[0]
+        season_encoded = encoders['Season'].transform([season])[0]
+        soil_type_encoded = encoders['Soil Type'].transform([soil_type])[0]
 
         # Put all input values into a 2D list (model expects it this way)
         input_features = [[crop_name_encoded, region_encoded, season_encoded,
                            temperature, moisture, soil_type_encoded, soil_ph]]
 
         # Make predictions using the loaded models
-        seed_size_encoded = seed_size_model.predict(input_features)[0]
-        sowing_depth = sowing_depth_model.predict(input_features)[0]
-        spacing = spacing_model.predict(input_features)[0]
+        seed_size_encoded = models['seed_size_model'].predict(input_features)[0]
+        sowing_depth = models['sowing_depth_model'].predict(input_features)[0]
+        spacing = models['spacing_model'].predict(input_features)[0]
 
         # Convert the predicted seed size from a number back to text (e.g. 0 → 'Small')
-        seed_size = label_encoders['Seed Size Category'].inverse_transform([seed_size_encoded])[0]
+        seed_size = encoders['Seed Size Category'].inverse_transform([seed_size_encoded])[0]
 
         # Round the numeric values to two decimal places for better display
         sowing_depth = round(sowing_depth, 2)
@@ -108,6 +348,12 @@ def predict():
                 'suitable_crops': []
             }
 
+        # Show the closest historical plantings next to the prediction
+        similar_index = get_similar_index()
+        similar_plantings = []
+        if similar_index is not None:
+            similar_plantings = similar_index.query(crop_name, season, temperature, moisture, soil_ph, k=3)
+
         # Return the prediction results in JSON format
         return jsonify({
             'seed_size': seed_size,
@@ -115,7 +361,11 @@ def predict():
             'spacing': spacing,
             'selected_soil_type': soil_type,
             'soil_description': soil_data.get('description', ''),
-            'recommended_crops': []  # This will be filled using Gemini or manually later
+            'recommended_crops': [],  # This will be filled using Gemini or manually later
+            'region': region,
+            'model_version': bundle['version'],
+            'model_shard': shard,
+            'similar_plantings': similar_plantings
         })
 
     except Exception as e:
@@ -128,6 +378,108 @@ def get_soil_types():
     """Returns all soil type details as JSON"""
     return jsonify(soil_types)
 
+@app.route('/api/models', methods=['GET'])
+def get_model_versions():
+    """Returns the model version being served and the versions available in the registry"""
+    return jsonify({
+        'current': active_bundle['version'],
+        'pointer': model_registry.get_current_version(registry_dir),
+        'versions': model_registry.list_versions(registry_dir),
+        'history': model_registry.get_history(registry_dir)
+    })
+
+@app.route('/api/shards/metrics', methods=['GET'])
+def get_shard_metrics():
+    """Returns shard hit rate, load latency and residency for the model version being served"""
+    return jsonify(dict(active_bundle['shards'].metrics(), model_version=active_bundle['version']))
+
+@app.route('/api/server-stats', methods=['GET'])
+def get_server_stats():
+    """Returns how many requests are in progress and how long the app spent at each level"""
+    update_in_flight(0)  # Bring the time at the current level up to now
+    with server_stats_lock:
+        stats = dict(server_stats)
+        stats['seconds_at_in_flight'] = {str(level): round(seconds, 4)
+                                         for level, seconds in sorted(server_stats['seconds_at_in_flight'].items())}
+    return jsonify(stats)
+
+@app.route('/api/models/reload', methods=['POST'])
+def reload_models():
+    """Checks the registry right away instead of waiting for the background watcher"""
+    try:
+        swapped = registry_watcher.check_now()
+        return jsonify({'status': 'success', 'swapped': swapped, 'current': active_bundle['version']})
+    except Exception as e:
+        app.logger.error(f"Model reload error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/models/rollback', methods=['POST'])
+def rollback_models():
+    """Points the registry back at the previous (or a given) version and swaps to it"""
+    try:
+        data = request.get_json(silent=True) or {}
+        # The target is validated before CURRENT moves, so a rejected version is never left as the pointer
+        version = registry_watcher.rollback(data.get('version'))
+        return jsonify({'status': 'success', 'current': version})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'current': active_bundle['version']}), 400
+    except Exception as e:
+        app.logger.error(f"Model rollback error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/similar', methods=['GET', 'POST'])
+def get_similar_plantings():
+    """Returns the closest historical plantings for one query (GET) or a batch of queries (POST)"""
+    try:
+        similar_index = get_similar_index()
+        if similar_index is None:
+            return jsonify({'error': 'Similar plantings index not found and the training data is missing'}), 503
+
+        if request.method == 'GET':
+            k = max(1, min(int(request.args.get('k', DEFAULT_K)), MAX_K))
+            neighbours = similar_index.query(
+                request.args['crop_name'],
+                request.args['season'],
+                float(request.args['temperature']),
+                float(request.args['moisture']),
+                float(request.args['soil_ph']),
+                k=k
+            )
+            return jsonify({'neighbours': neighbours})
+
+        # Batch mode: {"k": 5, "queries": [{"crop_name": ..., "season": ..., "temperature": ..., ...}, ...]}
+        data = request.get_json(silent=True) or {}
+        k = max(1, min(int(data.get('k', DEFAULT_K)), MAX_K))
+        results = similar_index.query_batch(data.get('queries', []), k=k)
+        return jsonify({'results': [{'neighbours': neighbours} for neighbours in results]})
+
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f"Invalid query: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Similar plantings error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/resolve-region', methods=['GET', 'POST'])
+def resolve_region_route():
+    """Returns the region (and district, if known) for one point (GET) or many points (POST)"""
+    try:
+        if request.method == 'GET':
+            return jsonify({'location': region_resolver.resolve(request.args['lat'], request.args['lon'])})
+
+        # Batch mode: {"lats": [...], "lons": [...]}
+        data = request.get_json(silent=True) or {}
+        lats, lons = data['lats'], data['lons']
+        if len(lats) != len(lons):
+            raise ValueError("lats and lons must have the same length")
+        indices = region_resolver.resolve_many(lats, lons)
+        return jsonify({'locations': region_resolver.regions_for(indices)})
+
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f"Invalid coordinates: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Region resolver error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 
 #--------------------------------------------------------------------------------------------------------------------------------------
 
@@ -220,7 +572,7 @@ def weather_proxy():
         
         # If there's an API key available, try the live API first
         if api_key:
-            url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={api_key}"
+            url = f"{OPENWEATHER_API_URL}?lat={lat}&lon={lon}&units=metric&appid={api_key}"
             response = requests.get(url, timeout=5)
             
             # Check if we got a valid response
@@ -229,6 +581,7 @@ def weather_proxy():
                 
                 # Validate that the response contains required fields
                 if 'main' in data and 'temp' in data['main'] and 'weather' in data and len(data['weather']) > 0:
+                    data['region'] = resolve_region(lat, lon)
                     return jsonify(data)
         
         # If we reach here, we need to use the fallback data
@@ -249,20 +602,12 @@ def get_fallback_weather_data(lat=None, lon=None):
     
     # Generate location name based on coordinates
     location_name = "Maharashtra"
+    region = None
     if lat and lon:
-        lat_f = float(lat)
-        lon_f = float(lon)
-        
-        if lat_f > 19.5 and lat_f <= 21.8 and lon_f >= 75.0 and lon_f <= 78.5:
-            location_name = "Vidarbha Region"
-        elif lat_f >= 17.5 and lat_f <= 19.5 and lon_f >= 75.5 and lon_f <= 78.0:
-            location_name = "Marathwada Region"
-        elif lat_f >= 15.5 and lat_f <= 19.0 and lon_f >= 73.5 and lon_f <= 75.5:
-            location_name = "Western Maharashtra"
-        elif lat_f >= 15.5 and lat_f <= 20.0 and lon_f >= 72.5 and lon_f <= 73.5:
-            location_name = "Konkan Region"
-        elif lat_f >= 20.0 and lat_f <= 22.0 and lon_f >= 73.5 and lon_f <= 75.0:
-            location_name = "North Maharashtra"
+        feature = region_resolver.resolve(lat, lon)
+        if feature:
+            location_name = feature['name']
+            region = feature['region']
     
     result = {
         'main': {
@@ -275,6 +620,7 @@ def get_fallback_weather_data(lat=None, lon=None):
             'speed': 3.5
         },
         'name': location_name,
+        'region': region,
         'sys': {
             'country': 'IN',
             'sunrise': int((now.replace(hour=6, minute=0, second=0)).timestamp()),
@@ -295,7 +641,7 @@ def get_sensor_data():
     """API endpoint to serve the sensor data from the sensorData folder"""
     try:
         # Read the plant_data.json file from the sensorData folder
-        sensor_data_path = os.path.join(current_dir, 'sensorData', 'plant_data.json')
+        sensor_data_path = os.path.join(sensor_data_dir, 'plant_data.json')
         
         # Check if the file exists
         if not os.path.exists(sensor_data_path):
@@ -345,11 +691,18 @@ def update_sensor_data():
         result = subprocess.run(['python', plant_monitor_path], 
                                capture_output=True, 
                                text=True,
-                               cwd=os.path.join(current_dir, 'sensorData'))
+                               cwd=sensor_data_dir)
         
         # Check if execution was successful
         if result.returncode == 0:
-            return jsonify({"status": "success", "message": "Sensor data updated"})
+            # Feed the new reading to the rolling statistics and the plots subscribed to the plant monitor
+            with open(os.path.join(sensor_data_dir, 'plant_data.json'), 'r') as file:
+                readings = json.load(file)
+            updates, anomalies = [], []
+            if readings:
+                updates, anomalies = record_sensor_reading(DEFAULT_SENSOR_DEVICE, readings[-1])
+            return jsonify({"status": "success", "message": "Sensor data updated",
+                            "updated_plots": len(updates), "anomalies": anomalies})
         else:
             return jsonify({
                 "status": "error", 
@@ -360,6 +713,107 @@ def update_sensor_data():
         app.logger.error(f"Update sensor data error: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/subscriptions', methods=['GET'])
+def list_subscriptions():
+    """Returns the subscribed plots (optionally for one device) with their latest recommendations"""
+    return jsonify({
+        'plots': sensor_subscriptions.get_results(request.args.get('device_id')),
+        'stats': dict(sensor_subscriptions.stats)
+    })
+
+@app.route('/api/subscriptions', methods=['POST'])
+def subscribe_plot():
+    """Subscribes a plot to a sensor device with its fixed crop, region, season and soil inputs"""
+    try:
+        data = request.get_json(silent=True) or {}
+        device_id = data.get('device_id', DEFAULT_SENSOR_DEVICE)
+        plot_id = data['plot_id']
+        if not data.get('region') and data.get('lat') is not None and data.get('lon') is not None:
+            data['region'] = resolve_region(data['lat'], data['lon'])
+
+        # Reject values the models don't know now, so they can't break a whole batch later
+        encoders = active_bundle['models']['label_encoders']
+        for field, column in [('crop_name', 'Crop Name'), ('region', 'Region'),
+                              ('season', 'Season'), ('soil_type', 'Soil Type')]:
+            if data.get(field) not in encoders[column].classes_:
+                raise ValueError(f"Unknown {field}: {data.get(field)}")
+
+        plot = sensor_subscriptions.subscribe(device_id, plot_id, data)
+        return jsonify({'status': 'success', 'plot': plot})
+    except (KeyError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f"Invalid subscription: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Subscription error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/subscriptions/<device_id>/<plot_id>', methods=['DELETE'])
+def unsubscribe_plot(device_id, plot_id):
+    """Stops keeping a plot's recommendation up to date"""
+    if not sensor_subscriptions.unsubscribe(device_id, plot_id):
+        return jsonify({'status': 'error', 'message': 'Subscription not found'}), 404
+    return jsonify({'status': 'success'})
+
+@app.route('/api/subscriptions/stream')
+def stream_subscriptions():
+    """Server-sent events with every recommendation that changed"""
+    device_id = request.args.get('device_id')
+    listener = sensor_subscriptions.listen()
+
+    def events():
+        try:
+            while True:
+                try:
+                    update = listener.get(timeout=15)
+                except queue.Empty:
+                    # Comment line so proxies don't close an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                if device_id is None or update['device_id'] == device_id:
+                    yield f"data: {json.dumps(update)}\n\n"
+        finally:
+            sensor_subscriptions.unlisten(listener)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/sensor-readings', methods=['POST'])
+def receive_sensor_reading():
+    """Accepts a reading from a sensor device and updates the plots subscribed to it"""
+    try:
+        data = request.get_json(silent=True) or {}
+        device_id = data.get('device_id', DEFAULT_SENSOR_DEVICE)
+        reading = {
+            'timestamp': data.get('timestamp'),
+            'temperature': float(data['temperature']),
+            'humidity': float(data['humidity']) if data.get('humidity') is not None else None
+        }
+        # Boards send raw 0-255 soil moisture; other clients may send a percentage directly
+        if 'moisture' in data:
+            reading['soil_moisture'] = float(data['moisture']) * 255 / 100
+        else:
+            reading['soil_moisture'] = float(data['soil_moisture'])
+
+        updates, anomalies = record_sensor_reading(device_id, reading)
+        return jsonify({'status': 'success', 'updated': updates, 'anomalies': anomalies})
+    except (KeyError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f"Invalid reading: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Sensor reading error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/sensor-aggregates', methods=['GET'])
+def get_sensor_aggregates():
+    """Returns rolling mean/min/max/EWMA/rate of change and anomaly flags per sensor device"""
+    devices = sensor_aggregates.summary(request.args.get('device_id'))
+    for summary in devices.values():
+        # Window averages in the units the /predict form expects
+        temperature = summary['fields']['temperature']['mean']
+        soil_moisture = summary['fields']['soil_moisture']['mean']
+        summary['predict_inputs'] = {
+            'temperature': temperature,
+            'moisture': soil_moisture_percent(soil_moisture) if soil_moisture is not None else None
+        }
+    return jsonify({'devices': devices})
+
 @app.route('/api/crops/recommend', methods=['POST'])
 def recommend_crops():
     """API endpoint to get crop recommendations using Gemini API"""
@@ -408,7 +862,7 @@ Format your response ONLY as a JSON array containing 5-7 crop names:
             return jsonify({"error": "Gemini API key not found"}), 400
             
         response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={api_key}",
+            f"{GEMINI_API_URL}?key={api_key}",
             json={
                 "contents": [{
                     "parts": [{
@@ -419,7 +873,8 @@ Format your response ONLY as a JSON array containing 5-7 crop names:
                     "temperature": 0.9,
                     "maxOutputTokens": 1024
                 }
-            }
+            },
+            timeout=15  # A stalled Gemini call must not hold a worker forever
         )
         
         if response.status_code != 200:
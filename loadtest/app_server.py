@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Runs app.py for the load test with a fixed number of request workers
+#
+# Flask's development server starts a new thread for every connection, so it never runs out of
+# workers. Here at most --workers requests are handled at once; further connections wait in the
+# listen queue, the same way they would with a fixed pool of gunicorn or waitress workers.
+import argparse
+import os
+import sys
+import threading
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+# Project root (the folder with app.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class OneRequestHandler(WSGIRequestHandler):
+    # HTTP/1.0 closes the connection after each response, so a keep-alive client can't hold a worker
+    protocol_version = 'HTTP/1.0'
+
+
+class FixedWorkerServer(ThreadedWSGIServer):
+    """Threaded WSGI server that handles at most `workers` requests at the same time"""
+
+    def __init__(self, host, port, app, workers):
+        self.free_workers = threading.BoundedSemaphore(workers)
+        super().__init__(host, port, app, handler=OneRequestHandler)
+
+    def process_request(self, request, client_address):
+        # Stop accepting until a worker is free
+        self.free_workers.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.free_workers.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.free_workers.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve app.py with a fixed number of request workers")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, required=True, help="requests handled at the same time")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT_DIR)
+    os.chdir(ROOT_DIR)
+    import app
+
+    FixedWorkerServer(args.host, args.port, app.app, args.workers).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Local stand-ins for the outside services app.py talks to, so it can be load-tested offline:
+#   - the Smart Plant Monitor board page read by sensorData/plant_monitor.py
+#   - the Gemini generateContent endpoint used by /api/crops/recommend
+#   - the OpenWeatherMap current weather endpoint used by /api/weather-proxy
+#
+# Every fake can add latency, fail a share of requests, and act as a "slow loris"
+# (send the headers, then drip the body out a few bytes at a time).
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FAKE_CROPS = ['Pigeon Pea', 'Green Gram', 'Safflower', 'Sesame', 'Cluster Bean',
+              'Horse Gram', 'Finger Millet', 'Turmeric', 'Bitter Gourd', 'Moth Bean']
+
+
+class Behaviour:
+    """How a fake service misbehaves"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, slowloris_rate=0.0, slowloris_seconds=5.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slowloris_rate = slowloris_rate
+        self.slowloris_seconds = slowloris_seconds
+
+    def delay(self):
+        seconds = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Shared plumbing: latency, injected errors and slow-loris responses"""
+
+    # Set on the subclass created for each server
+    behaviour = Behaviour()
+    stats = None
+    stats_lock = None
+
+    # Keep the load test output readable
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _respond(self, status, body, content_type):
+        self._count('requests')
+        self.behaviour.delay()
+
+        if random.random() < self.behaviour.error_rate:
+            self._count('errors')
+            status, body, content_type = 503, b'{"error": "injected failure"}', 'application/json'
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if random.random() < self.behaviour.slowloris_rate:
+            # Drip the body out over slowloris_seconds
+            self._count('slowloris')
+            pause = self.behaviour.slowloris_seconds / max(1, len(body))
+            try:
+                for i in range(len(body)):
+                    self.wfile.write(body[i:i + 1])
+                    self.wfile.flush()
+                    time.sleep(pause)
+            except (BrokenPipeError, ConnectionResetError):
+                self._count('client_disconnects')
+            return
+
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self._count('client_disconnects')
+
+
+class PlantMonitorHandler(FakeHandler):
+    """Emulates the Smart Plant Monitor HTML page"""
+
+    def do_GET(self):
+        html = (
+            "<html><head><title>Smart Plant Monitor</title></head><body>"
+            "<h1>Smart Plant Monitor</h1>"
+            f"<p><b>Temperature:</b> {random.uniform(18, 38):.1f} &deg;C</p>"
+            f"<p><b>Humidity:</b> {random.uniform(30, 90):.1f} %</p>"
+            f"<p><b>Soil Moisture:</b> {random.randint(0, 255)}</p>"
+            f"<p><b>Motion Detected:</b> {random.choice(['YES', 'NO'])}</p>"
+            f"<p><b>Pump State:</b> {random.choice(['ON', 'OFF'])}</p>"
+            "</body></html>"
+        )
+        self._respond(200, html.encode(), 'text/html')
+
+
+class GeminiHandler(FakeHandler):
+    """Emulates POST .../models/<model>:generateContent"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if not urlparse(self.path).path.endswith(':generateContent'):
+            self._respond(404, b'{"error": "not found"}', 'application/json')
+            return
+        crops = random.sample(FAKE_CROPS, 6)
+        body = {
+            'candidates': [{
+                'content': {'parts': [{'text': json.dumps(crops)}], 'role': 'model'},
+                'finishReason': 'STOP'
+            }]
+        }
+        self._respond(200, json.dumps(body).encode(), 'application/json')
+
+
+class OpenWeatherHandler(FakeHandler):
+    """Emulates GET /data/2.5/weather"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/data/2.5/weather':
+            self._respond(404, b'{"cod": "404"}', 'application/json')
+            return
+        query = parse_qs(url.query)
+        now = int(time.time())
+        body = {
+            'coord': {'lat': float(query.get('lat', ['19.076'])[0]), 'lon': float(query.get('lon', ['72.8777'])[0])},
+            'weather': [{'id': 800, 'main': 'Clear', 'description': 'clear sky', 'icon': '01d'}],
+            'main': {'temp': round(random.uniform(18, 38), 1), 'humidity': random.randint(30, 90), 'pressure': 1012},
+            'wind': {'speed': round(random.uniform(0, 8), 1)},
+            'dt': now,
+            'sys': {'country': 'IN', 'sunrise': now - 21600, 'sunset': now + 21600},
+            'name': 'Fake Town',
+            'cod': 200
+        }
+        self._respond(200, json.dumps(body).encode(), 'application/json')
+
+
+class FakeService:
+    """One fake HTTP server running in a background thread"""
+
+    def __init__(self, handler_class, behaviour, host='127.0.0.1', port=0):
+        self.stats = {}
+        # Each server gets its own handler subclass so behaviour and counters are not shared
+        handler = type(handler_class.__name__, (handler_class,), {
+            'behaviour': behaviour, 'stats': self.stats, 'stats_lock': threading.Lock()
+        })
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_fake_services(plant_monitor=None, gemini=None, openweather=None):
+    """Start all three fakes on free local ports and return them with the env vars app.py needs"""
+    services = {
+        'plant_monitor': FakeService(PlantMonitorHandler, plant_monitor or Behaviour()).start(),
+        'gemini': FakeService(GeminiHandler, gemini or Behaviour()).start(),
+        'openweather': FakeService(OpenWeatherHandler, openweather or Behaviour()).start()
+    }
+    env = {
+        'PLANT_MONITOR_URL': services['plant_monitor'].url + '/',
+        'GEMINI_API_URL': services['gemini'].url + '/v1beta/models/gemini-pro:generateContent',
+        'OPENWEATHER_API_URL': services['openweather'].url + '/data/2.5/weather'
+    }
+    return services, env
+
+
+if __name__ == '__main__':
+    # Run the fakes on their own, e.g. to point a manually started app.py at them
+    services, env = start_fake_services()
+    print("Fake services running. Start app.py with:")
+    for key, value in env.items():
+        print(f"  export {key}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for service in services.values():
+            service.stop()
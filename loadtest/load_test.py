@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# Offline load test for app.py
+#
+# Starts the fake Smart Plant Monitor, Gemini and OpenWeatherMap services from fake_services.py,
+# starts app.py pointed at them (or uses an app that is already running), sends a mixed traffic
+# profile at it and reports throughput, tail latency and how saturated the workers were.
+# Requests in flight are counted by the app itself (GET /api/server-stats), not by the clients.
+import argparse
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import queue
+
+import requests
+
+from fake_services import Behaviour, start_fake_services
+
+# Project root (the folder with app.py)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'predict=50,similar=10,weather=20,recommend=15,update_sensor=5'
+
+# Rough bounding box of Maharashtra, used for random coordinates
+LAT_RANGE = (15.6, 22.0)
+LON_RANGE = (72.6, 80.9)
+
+
+def load_dropdown_values():
+    """The same crop/region/season/soil values the web form offers"""
+    with open(os.path.join(ROOT_DIR, 'unique_values.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+def random_conditions(values):
+    return {
+        'crop_name': random.choice(values['Crop Name']),
+        'region': random.choice(values['Region']),
+        'season': random.choice(values['Season']),
+        'soil_type': random.choice(values['Soil Type']),
+        'temperature': round(random.uniform(15, 40), 1),
+        'moisture': round(random.uniform(10, 90), 1),
+        'soil_ph': round(random.uniform(5.0, 8.5), 1)
+    }
+
+
+def make_request_builders(values):
+    """One function per endpoint in the traffic mix; each sends a single request with a session"""
+
+    def predict(session, base_url):
+        return session.post(f"{base_url}/predict", data=random_conditions(values), timeout=30)
+
+    def similar(session, base_url):
+        conditions = random_conditions(values)
+        return session.get(f"{base_url}/api/similar", params=conditions, timeout=30)
+
+    def weather(session, base_url):
+        params = {'lat': round(random.uniform(*LAT_RANGE), 4), 'lon': round(random.uniform(*LON_RANGE), 4)}
+        return session.get(f"{base_url}/api/weather-proxy", params=params, timeout=30)
+
+    def recommend(session, base_url):
+        conditions = random_conditions(values)
+        conditions['humidity'] = round(random.uniform(30, 90))
+        return session.post(f"{base_url}/api/crops/recommend", json=conditions, timeout=30)
+
+    def update_sensor(session, base_url):
+        return session.post(f"{base_url}/api/update-sensor-data", timeout=60)
+
+    return {'predict': predict, 'similar': similar, 'weather': weather,
+            'recommend': recommend, 'update_sensor': update_sensor}
+
+
+def is_success(response):
+    """Some routes answer errors with status 200 and an 'error' key, so look at the body too"""
+    if response.status_code >= 400:
+        return False
+    if response.headers.get('Content-Type', '').startswith('application/json'):
+        body = response.json()
+        return not (isinstance(body, dict) and 'error' in body)
+    return True
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def start_app(env, port, workers=None):
+    """Start app.py in a subprocess (with a fixed number of request workers if given) and wait until it answers"""
+    if workers:
+        command = [sys.executable, os.path.join(ROOT_DIR, 'loadtest', 'app_server.py'),
+                   '--port', str(port), '--workers', str(workers)]
+    else:
+        command = [sys.executable, '-c',
+                   f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app.py exited during startup")
+        try:
+            requests.get(f"{base_url}/api/models", timeout=1)
+            return process, base_url
+        except requests.exceptions.RequestException:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("app.py did not start within 60 seconds")
+
+
+def get_server_stats(base_url):
+    """The app's own count of requests in flight, or None if it doesn't have /api/server-stats"""
+    try:
+        response = requests.get(f"{base_url}/api/server-stats", timeout=30)
+        return response.json() if response.status_code == 200 else None
+    except requests.exceptions.RequestException:
+        return None
+
+
+def in_flight_summary(before, after, app_workers):
+    """Mean in flight and saturated share over the run, from two /api/server-stats snapshots"""
+    if not before or not after:
+        return {'mean_in_flight': None, 'peak_in_flight': None, 'saturated_fraction': None}
+    seconds = {int(level): total - before['seconds_at_in_flight'].get(level, 0.0)
+               for level, total in after['seconds_at_in_flight'].items()}
+    total_seconds = sum(seconds.values())
+    if total_seconds <= 0:
+        return {'mean_in_flight': None, 'peak_in_flight': after['peak_in_flight'], 'saturated_fraction': None}
+    return {
+        'mean_in_flight': round(sum(level * s for level, s in seconds.items()) / total_seconds, 2),
+        # Highest count since the app started (only the run itself when the harness started the app)
+        'peak_in_flight': after['peak_in_flight'],
+        # Share of the run where every worker was busy and new requests had to wait
+        'saturated_fraction': round(sum(s for level, s in seconds.items() if level >= app_workers) / total_seconds, 3)
+        if app_workers else None
+    }
+
+
+def process_threads(pid):
+    """Number of OS threads in the app process (Linux only), a proxy for busy request workers"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class LoadRunner:
+    """Sends requests from a pool of worker threads, open loop (fixed rate) or closed loop"""
+
+    def __init__(self, base_url, builders, mix, concurrency, duration, rate, app_pid=None):
+        self.base_url = base_url
+        self.builders = builders
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.app_pid = app_pid
+
+        self.results = []  # (endpoint, ok, latency seconds, queue delay seconds)
+        self.results_lock = threading.Lock()
+        self.thread_samples = []  # OS threads in the app process
+        self.jobs = queue.Queue()
+        self.stop_event = threading.Event()
+
+    def _send(self, session, name, scheduled_at):
+        started = time.perf_counter()
+        try:
+            ok = is_success(self.builders[name](session, self.base_url))
+        except Exception:
+            ok = False
+        finished = time.perf_counter()
+        with self.results_lock:
+            self.results.append((name, ok, finished - started, started - scheduled_at))
+
+    def _open_loop_worker(self):
+        session = requests.Session()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            self._send(session, *job)
+
+    def _closed_loop_worker(self, end):
+        session = requests.Session()
+        while time.perf_counter() < end:
+            self._send(session, random.choices(self.names, self.weights)[0], time.perf_counter())
+
+    def _sampler(self):
+        while not self.stop_event.wait(0.05):
+            threads = process_threads(self.app_pid)
+            if threads is not None:
+                self.thread_samples.append(threads)
+
+    def run(self):
+        sampler = threading.Thread(target=self._sampler, daemon=True)
+        if self.app_pid:
+            sampler.start()
+        self.server_before = get_server_stats(self.base_url)
+        started = time.perf_counter()
+        end = started + self.duration
+
+        if self.rate:
+            # Open loop: Poisson arrivals at the requested rate, whether or not the app keeps up.
+            # Requests wait in the queue when every client worker is busy, which shows up as queue delay.
+            workers = [threading.Thread(target=self._open_loop_worker, daemon=True)
+                       for _ in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+            next_at = started
+            while next_at < end:
+                now = time.perf_counter()
+                if next_at > now:
+                    time.sleep(next_at - now)
+                self.jobs.put((random.choices(self.names, self.weights)[0], next_at))
+                next_at += random.expovariate(self.rate)
+            for _ in workers:
+                self.jobs.put(None)
+        else:
+            # Closed loop: every worker sends its next request as soon as the last one finishes
+            workers = [threading.Thread(target=self._closed_loop_worker, args=(end,), daemon=True)
+                       for _ in range(self.concurrency)]
+            for worker in workers:
+                worker.start()
+
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - started
+        self.server_after = get_server_stats(self.base_url)
+        self.stop_event.set()
+        if sampler.is_alive():
+            sampler.join()
+
+    def report(self, app_workers):
+        by_endpoint = {}
+        for name, ok, latency, delay in self.results:
+            by_endpoint.setdefault(name, []).append((ok, latency, delay))
+
+        def summary(rows):
+            latencies = sorted(latency for _, latency, _ in rows)
+            delays = sorted(delay for _, _, delay in rows)
+            return {
+                'requests': len(rows),
+                'errors': sum(1 for ok, _, _ in rows if not ok),
+                'throughput_rps': round(len(rows) / self.elapsed, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                'p90_ms': round(percentile(latencies, 90) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+                'max_ms': round((latencies[-1] if latencies else 0) * 1000, 1),
+                # Closed-loop requests are sent the moment they are due, so only open loop has queue delay
+                'queue_p99_ms': round(percentile(delays, 99) * 1000, 1) if self.rate else None
+            }
+
+        return {
+            'duration_s': round(self.elapsed, 1),
+            'overall': summary([(ok, latency, delay) for _, ok, latency, delay in self.results]),
+            'endpoints': {name: summary(rows) for name, rows in sorted(by_endpoint.items())},
+            'workers': dict(
+                in_flight_summary(self.server_before, self.server_after, app_workers),
+                capacity=app_workers,
+                peak_app_threads=max(self.thread_samples) if self.thread_samples else None
+            )
+        }
+
+
+def print_report(report):
+    print(f"\nRan for {report['duration_s']} s")
+    header = f"{'endpoint':<15}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p90 ms':>9}" \
+             f"{'p99 ms':>9}{'max ms':>9}{'queue p99':>11}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['endpoints'].items()) + [('ALL', report['overall'])]
+    for name, s in rows:
+        queue_p99 = s['queue_p99_ms'] if s['queue_p99_ms'] is not None else '-'
+        print(f"{name:<15}{s['requests']:>9}{s['errors']:>8}{s['throughput_rps']:>9}{s['p50_ms']:>9}"
+              f"{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}{queue_p99:>11}")
+    w = report['workers']
+    if w['mean_in_flight'] is None:
+        print("\nWorkers: the app has no /api/server-stats, so requests in flight are unknown")
+    else:
+        print(f"\nWorkers: capacity {w['capacity'] or 'unlimited'}, mean in flight {w['mean_in_flight']}, "
+              f"peak in flight {w['peak_in_flight']}"
+              + (f", saturated {w['saturated_fraction'] * 100:.1f}% of the time"
+                 if w['saturated_fraction'] is not None else ""))
+    if w['peak_app_threads'] is not None:
+        print(f"Peak app threads: {w['peak_app_threads']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the seed predictor app")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to send traffic for")
+    parser.add_argument('--concurrency', type=int, default=20, help="client worker threads")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="requests per second (open loop); 0 keeps every worker busy (closed loop)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--app-url', help="test an app that is already running instead of starting one")
+    parser.add_argument('--app-port', type=int, default=5055, help="port for the app started by the harness")
+    parser.add_argument('--app-workers', type=int,
+                        help="run the app with this many request workers (default: one thread per connection); "
+                             "with --app-url, the number of workers that app was started with")
+    parser.add_argument('--latency-ms', type=float, default=50, help="fake service latency")
+    parser.add_argument('--jitter-ms', type=float, default=20, help="fake service latency standard deviation")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="share of fake responses that fail")
+    parser.add_argument('--slowloris-rate', type=float, default=0.0,
+                        help="share of fake responses whose body is dripped out slowly")
+    parser.add_argument('--slowloris-seconds', type=float, default=5.0, help="how long a slow response takes")
+    parser.add_argument('--gemini-latency-ms', type=float, help="override the latency for the Gemini fake")
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    def behaviour(latency_ms):
+        return Behaviour(latency_ms=latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         slowloris_rate=args.slowloris_rate, slowloris_seconds=args.slowloris_seconds)
+
+    services, fake_env = start_fake_services(
+        plant_monitor=behaviour(args.latency_ms),
+        gemini=behaviour(args.gemini_latency_ms if args.gemini_latency_ms is not None else args.latency_ms),
+        openweather=behaviour(args.latency_ms)
+    )
+
+    app_process = None
+    sensor_dir = tempfile.TemporaryDirectory()
+    try:
+        if args.app_url:
+            base_url = args.app_url.rstrip('/')
+            print("Using the running app; it must have been started with:")
+            for key, value in fake_env.items():
+                print(f"  {key}={value}")
+        else:
+            env = dict(os.environ, **fake_env)
+            env.setdefault('GEMINI_API_KEY', 'load-test')
+            # Keep plant_monitor.py from overwriting the real sensorData files
+            env['SENSOR_DATA_DIR'] = sensor_dir.name
+            app_process, base_url = start_app(env, args.app_port, args.app_workers)
+            print(f"Started app.py at {base_url}"
+                  + (f" with {args.app_workers} workers" if args.app_workers else ""))
+
+        runner = LoadRunner(base_url, make_request_builders(load_dropdown_values()), parse_mix(args.mix),
+                            args.concurrency, args.duration, args.rate,
+                            app_pid=app_process.pid if app_process else None)
+        print(f"Sending traffic for {args.duration:g} s with {args.concurrency} workers"
+              + (f" at {args.rate:g} req/s" if args.rate else " (closed loop)"))
+        runner.run()
+
+        report = runner.report(args.app_workers)
+        report['fake_services'] = {name: dict(service.stats) for name, service in services.items()}
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if app_process:
+            app_process.terminate()
+            app_process.wait()
+        for service in services.values():
+            service.stop()
+        sensor_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,16 @@ from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier  # Ma
 from sklearn.preprocessing import LabelEncoder  # Converts text data into numbers
 from sklearn.metrics import mean_squared_error, classification_report, accuracy_score  # To check how good our model is
 from sklearn.pipeline import Pipeline  # Not used here, but helpful for combining steps together
+import model_registry  # Keeps every trained version so the web app can swap to it without restarting
+from similar_plantings import build_similar_index, SIMILAR_INDEX_FILE  # Nearest historical plantings lookup
+import os  # Helps with file paths
+import argparse  # Reads options from the command line
+from shard_cache import ShardCache, SHARDS_DIR, MANIFEST_FILE, shard_file_name  # Per-region model shards
+
+# Optional: also train one set of models per region (or any other column, e.g. a future 'State')
+parser = argparse.ArgumentParser(description="Train the seed size, sowing depth and spacing models")
+parser.add_argument('--shard-by', help="also train model shards per value of this column, e.g. Region")
+args = parser.parse_args()
 
 # Load the Excel file into a DataFrame
 df = pd.read_excel('Maharashtra_Agriculture_Realistic.xlsx')
@@ -106,3 +116,74 @@ with open('unique_values.pkl', 'wb') as f:
     pickle.dump(unique_values, f)
 
 print("Unique values saved to 'unique_values.pkl'")
+
+# Build the index used to find the most similar historical plantings for a query
+similar_index = build_similar_index(df)
+with open(SIMILAR_INDEX_FILE, 'wb') as f:
+    pickle.dump(similar_index, f)
+
+print(f"Similar plantings index ({len(similar_index)} rows) saved to '{SIMILAR_INDEX_FILE}'")
+
+# Turn data rows into the form-style inputs the web app and the registry work with
+def form_inputs(rows):
+    return [{
+        'crop_name': row['Crop Name'],
+        'region': row['Region'],
+        'season': row['Season'],
+        'temperature': float(row['Temperature (°C)']),
+        'moisture': float(row['Moisture (%)']),
+        'soil_type': row['Soil Type'],
+        'soil_ph': float(row['Soil pH'])
+    } for _, row in rows.iterrows()]
+
+# Train one smaller set of models per region, sharing the label encoders of the global models.
+# The web app loads a region's shard when a request for it arrives and falls back to the global models otherwise.
+shard_files = {}
+if args.shard_by:
+    shard_values = df.loc[X_train.index, args.shard_by]
+    test_shard_values = df.loc[X_test.index, args.shard_by]
+    manifest = {'shard_by': args.shard_by, 'label_encoders': label_encoders, 'shards': {}}
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    for value in sorted(shard_values.unique()):
+        rows = (shard_values == value).to_numpy()
+        shard_models = {
+            'seed_size_model': RandomForestClassifier(n_estimators=100, random_state=42).fit(
+                X_train[rows], y_seed_size_train[rows]),
+            'sowing_depth_model': RandomForestRegressor(n_estimators=100, random_state=42).fit(
+                X_train[rows], y_depth_train[rows]),
+            'spacing_model': RandomForestRegressor(n_estimators=100, random_state=42).fit(
+                X_train[rows], y_spacing_train[rows])
+        }
+        file_name = shard_file_name(value)
+        with open(os.path.join(SHARDS_DIR, file_name), 'wb') as f:
+            pickle.dump(shard_models, f)
+        # A few test rows of this region with what the shard predicts, replayed before the shard is served
+        shard_golden_rows = df.loc[test_shard_values.index[test_shard_values == value][:5]]
+        shard_golden_inputs = model_registry.make_golden_inputs(dict(shard_models, label_encoders=label_encoders),
+                                                                form_inputs(shard_golden_rows))
+        manifest['shards'][value] = {'file': file_name, 'rows': int(rows.sum()),
+                                     'bytes': os.path.getsize(os.path.join(SHARDS_DIR, file_name)),
+                                     'golden_inputs': shard_golden_inputs}
+        shard_files[f"{SHARDS_DIR}/{file_name}"] = shard_models
+        print(f"Shard '{value}' trained on {int(rows.sum())} rows")
+
+    with open(os.path.join(SHARDS_DIR, MANIFEST_FILE), 'wb') as f:
+        pickle.dump(manifest, f)
+    shard_files[f"{SHARDS_DIR}/{MANIFEST_FILE}"] = manifest
+    # Read every shard back from disk and replay its golden inputs before anything is published
+    ShardCache(SHARDS_DIR).validate()
+    print(f"Model shards saved to '{SHARDS_DIR}' and checked")
+elif os.path.exists(os.path.join(SHARDS_DIR, MANIFEST_FILE)):
+    # Shards from an earlier run don't match the models just trained
+    os.remove(os.path.join(SHARDS_DIR, MANIFEST_FILE))
+    print(f"Removed the outdated shard manifest from '{SHARDS_DIR}'")
+
+# Record what the new models predict for a few test rows. The web app replays these
+# before it swaps to this version, so a broken or mismatched artifact is never served.
+golden_rows = df.loc[X_test.index[:20]]
+golden_inputs = model_registry.make_golden_inputs(models, form_inputs(golden_rows))
+
+# Publish a new version into the registry and point CURRENT at it; a running app picks it up by itself
+version = model_registry.publish_version(model_registry.REGISTRY_DIR_NAME, models, unique_values, golden_inputs,
+                                         extra_files=dict(shard_files, **{SIMILAR_INDEX_FILE: similar_index}))
+print(f"Models published to '{model_registry.REGISTRY_DIR_NAME}' as version {version}")
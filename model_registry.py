@@ -0,0 +1,325 @@
+# Versioned model registry used by ml_model.py (to publish) and app.py (to hot-swap)
+#
+# Layout on disk:
+#   model_registry/
+#       CURRENT                      <- name of the version the app should serve
+#       HISTORY                      <- JSON list of versions that were made current, oldest first
+#       v20250513-112121/
+#           agricultural_models.pkl
+#           unique_values.pkl
+#           golden_inputs.json       <- sample inputs with the predictions recorded at training time
+import os
+import json
+import math
+import pickle
+import shutil
+import threading
+from datetime import datetime
+
+REGISTRY_DIR_NAME = 'model_registry'
+CURRENT_FILE = 'CURRENT'
+HISTORY_FILE = 'HISTORY'
+MODELS_FILE = 'agricultural_models.pkl'
+UNIQUE_VALUES_FILE = 'unique_values.pkl'
+GOLDEN_FILE = 'golden_inputs.json'
+
+# Order of the columns the models were trained on (see ml_model.py)
+FEATURE_COLUMNS = ['Crop Name', 'Region', 'Season', 'Temperature (°C)', 'Moisture (%)', 'Soil Type', 'Soil pH']
+CATEGORICAL_COLUMNS = ['Crop Name', 'Region', 'Season', 'Soil Type']
+
+# Form field name -> training column name
+INPUT_FIELDS = {
+    'crop_name': 'Crop Name',
+    'region': 'Region',
+    'season': 'Season',
+    'temperature': 'Temperature (°C)',
+    'moisture': 'Moisture (%)',
+    'soil_type': 'Soil Type',
+    'soil_ph': 'Soil pH'
+}
+
+# How far a regression output may drift from the recorded golden value (in cm)
+GOLDEN_TOLERANCE = 1e-6
+
+
+def encode_inputs(label_encoders, inputs):
+    """Turn a list of form-style input dicts into the 2D feature list the models expect"""
+    columns = {}
+    for field, column in INPUT_FIELDS.items():
+        values = [item[field] for item in inputs]
+        if column in CATEGORICAL_COLUMNS:
+            # One transform call per column instead of one per row
+            columns[column] = label_encoders[column].transform(values).tolist()
+        else:
+            columns[column] = [float(value) for value in values]
+    return [[columns[column][i] for column in FEATURE_COLUMNS] for i in range(len(inputs))]
+
+
+def _write_atomic(path, text):
+    """Write a small text file so readers never see a half-written version"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def list_versions(registry_dir):
+    """Return all published versions, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if name.startswith('v') and os.path.isdir(os.path.join(registry_dir, name)))
+
+
+def get_current_version(registry_dir):
+    """Return the version named in the CURRENT pointer, or None if there is none"""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE), 'r') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def get_history(registry_dir):
+    """Return the list of versions that have been made current, oldest first"""
+    try:
+        with open(os.path.join(registry_dir, HISTORY_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def set_current_version(registry_dir, version, record_history=True):
+    """Point CURRENT at an already published version"""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f"Unknown model version: {version}")
+    if record_history:
+        history = get_history(registry_dir)
+        if not history or history[-1] != version:
+            history.append(version)
+        _write_atomic(os.path.join(registry_dir, HISTORY_FILE), json.dumps(history, indent=2))
+    _write_atomic(os.path.join(registry_dir, CURRENT_FILE), version + '\n')
+
+
+def rollback(registry_dir, version=None, validate=None):
+    """Make the previous version (or the given one) current again and return its name
+
+    If validate is given, the target version is loaded and passed to it first. CURRENT and HISTORY
+    are only changed when that succeeds, so a broken version never becomes the pointer.
+    """
+    history = get_history(registry_dir)
+    current = get_current_version(registry_dir)
+
+    if version is None:
+        # Drop the current version from the end of the history and go back one step
+        while history and history[-1] == current:
+            history.pop()
+        if not history:
+            raise ValueError("There is no earlier model version to roll back to")
+        version = history[-1]
+    elif version not in list_versions(registry_dir):
+        raise ValueError(f"Unknown model version: {version}")
+    else:
+        history.append(version)
+
+    if validate is not None:
+        try:
+            validate(load_version(registry_dir, version))
+        except Exception as e:
+            raise ValueError(f"Model version {version} failed validation: {str(e)}") from e
+
+    _write_atomic(os.path.join(registry_dir, HISTORY_FILE), json.dumps(history, indent=2))
+    set_current_version(registry_dir, version, record_history=False)
+    return version
+
+
+def publish_version(registry_dir, models, unique_values, golden_inputs=None, extra_files=None, make_current=True):
+    """Save a new model version into the registry and (optionally) make it current
+
+    extra_files maps a file name to an object that will be pickled next to the models
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+
+    version = datetime.now().strftime('v%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(registry_dir, version)):
+        version = datetime.now().strftime('v%Y%m%d-%H%M%S') + f"-{suffix}"
+        suffix += 1
+
+    # Write everything into a temporary folder first, then rename it in one step
+    tmp_dir = os.path.join(registry_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        with open(os.path.join(tmp_dir, MODELS_FILE), 'wb') as f:
+            pickle.dump(models, f)
+        with open(os.path.join(tmp_dir, UNIQUE_VALUES_FILE), 'wb') as f:
+            pickle.dump(unique_values, f)
+        with open(os.path.join(tmp_dir, GOLDEN_FILE), 'w') as f:
+            json.dump(golden_inputs or [], f, indent=2)
+        for file_name, obj in (extra_files or {}).items():
+            # File names may include a sub-folder, e.g. 'model_shards/Konkan.pkl'
+            os.makedirs(os.path.dirname(os.path.join(tmp_dir, file_name)), exist_ok=True)
+            with open(os.path.join(tmp_dir, file_name), 'wb') as f:
+                pickle.dump(obj, f)
+        os.rename(tmp_dir, os.path.join(registry_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if make_current:
+        set_current_version(registry_dir, version)
+    return version
+
+
+def load_version(registry_dir, version):
+    """Load every artifact of one version into a bundle dictionary"""
+    version_dir = os.path.join(registry_dir, version)
+    with open(os.path.join(version_dir, MODELS_FILE), 'rb') as f:
+        models = pickle.load(f)
+    with open(os.path.join(version_dir, UNIQUE_VALUES_FILE), 'rb') as f:
+        unique_values = pickle.load(f)
+
+    golden_inputs = []
+    golden_path = os.path.join(version_dir, GOLDEN_FILE)
+    if os.path.exists(golden_path):
+        with open(golden_path, 'r') as f:
+            golden_inputs = json.load(f)
+
+    return {
+        'version': version,
+        'path': version_dir,
+        'models': models,
+        'unique_values': unique_values,
+        'golden_inputs': golden_inputs
+    }
+
+
+def make_golden_inputs(models, inputs):
+    """Record what the freshly trained models predict for a few sample inputs"""
+    predictions = predict_with_models(models, inputs)
+    return [{'inputs': item, 'expected': expected} for item, expected in zip(inputs, predictions)]
+
+
+def predict_with_models(models, inputs):
+    """Run all three models on a list of form-style inputs with one call per model"""
+    if not inputs:
+        return []
+    label_encoders = models['label_encoders']
+    features = encode_inputs(label_encoders, inputs)
+    seed_sizes = label_encoders['Seed Size Category'].inverse_transform(models['seed_size_model'].predict(features))
+    depths = models['sowing_depth_model'].predict(features)
+    spacings = models['spacing_model'].predict(features)
+    return [{
+        'seed_size': str(seed_size),
+        'sowing_depth': float(depth),
+        'spacing': float(spacing)
+    } for seed_size, depth, spacing in zip(seed_sizes, depths, spacings)]
+
+
+def validate_bundle(bundle):
+    """Check a loaded version against its golden set; raises ValueError on any mismatch"""
+    models = bundle['models']
+    for key in ['seed_size_model', 'sowing_depth_model', 'spacing_model', 'label_encoders']:
+        if key not in models:
+            raise ValueError(f"Model version {bundle['version']} is missing '{key}'")
+
+    golden_inputs = bundle['golden_inputs']
+    if not golden_inputs:
+        # Nothing recorded at training time, so at least make sure the models can predict
+        unique_values = bundle['unique_values']
+        golden_inputs = [{'inputs': {
+            'crop_name': unique_values['Crop Name'][0],
+            'region': unique_values['Region'][0],
+            'season': unique_values['Season'][0],
+            'temperature': 25.0,
+            'moisture': 50.0,
+            'soil_type': unique_values['Soil Type'][0],
+            'soil_ph': 7.0
+        }}]
+
+    check_golden_predictions(f"Model version {bundle['version']}", models, golden_inputs)
+
+
+def check_golden_predictions(label, models, golden_inputs):
+    """Replay golden inputs through a set of models; raises ValueError (starting with label) on any mismatch"""
+    predictions = predict_with_models(models, [case['inputs'] for case in golden_inputs])
+    for case, predicted in zip(golden_inputs, predictions):
+        for key in ['sowing_depth', 'spacing']:
+            if not math.isfinite(predicted[key]):
+                raise ValueError(f"{label} returned a non-finite {key}")
+        expected = case.get('expected')
+        if not expected:
+            continue
+        if predicted['seed_size'] != expected['seed_size']:
+            raise ValueError(f"{label} predicted seed size "
+                             f"{predicted['seed_size']} instead of {expected['seed_size']} for {case['inputs']}")
+        for key in ['sowing_depth', 'spacing']:
+            if abs(predicted[key] - expected[key]) > GOLDEN_TOLERANCE:
+                raise ValueError(f"{label} predicted {key} {predicted[key]:.4f} "
+                                 f"instead of {expected[key]:.4f} for {case['inputs']}")
+
+
+class RegistryWatcher(threading.Thread):
+    """Background thread that notices when CURRENT changes and hands the new bundle to a callback"""
+
+    def __init__(self, registry_dir, on_load, loaded_version=None, poll_seconds=5.0, logger=None, validate=None):
+        super().__init__(name='model-registry-watcher', daemon=True)
+        self.registry_dir = registry_dir
+        self.on_load = on_load
+        # Checks a loaded bundle before it is handed to on_load (raise to reject it)
+        self.validate = validate or validate_bundle
+        self.loaded_version = loaded_version
+        self.poll_seconds = poll_seconds
+        self.logger = logger
+        self._stop_event = threading.Event()
+        # Versions that failed validation are not retried until CURRENT changes again
+        self._rejected_version = None
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def check_now(self):
+        """Load and validate the current version if it differs from the one being served"""
+        with self._lock:
+            version = get_current_version(self.registry_dir)
+            if version is None or version == self.loaded_version or version == self._rejected_version:
+                return False
+            try:
+                bundle = load_version(self.registry_dir, version)
+                self.validate(bundle)
+            except Exception as e:
+                self._rejected_version = version
+                if self.logger:
+                    self.logger.error(f"Rejected model version {version}: {str(e)}")
+                return False
+            self.on_load(bundle)
+            self.loaded_version = version
+            self._rejected_version = None
+            return True
+
+    def rollback(self, version=None):
+        """Validate the previous (or given) version, then point CURRENT at it and hand it to on_load"""
+        loaded = []
+
+        def check(bundle):
+            self.validate(bundle)
+            loaded.append(bundle)
+
+        with self._lock:
+            version = rollback(self.registry_dir, version, validate=check)
+            self.on_load(loaded[0])
+            self.loaded_version = version
+            self._rejected_version = None
+            return version
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            try:
+                self.check_now()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Model registry watcher error: {str(e)}")
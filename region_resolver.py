@@ -0,0 +1,189 @@
+# Works out which region (and district, when the file has them) of Maharashtra a point is in
+#
+# Polygons are read from a local GeoJSON file. Each feature has the properties
+#   region   - one of the Region values the models were trained on (e.g. "Vidarbha")
+#   name     - the display name used by the weather proxy (e.g. "Vidarbha Region")
+#   district - the district name, or null for region-level polygons
+# When polygons overlap, the feature that comes first in the file wins. Points on a polygon's
+# border count as inside it, like the old lat/lon range checks (which used >= and <=).
+# The bundled file has approximate outlines of the five divisions the models know about.
+#
+# A uniform grid is laid over the polygons once at load time. Every cell keeps the polygons
+# whose bounding box touches it, and cells that lie completely inside their first polygon
+# are answered without any point-in-polygon test.
+import json
+import numpy as np
+
+REGIONS_FILE = 'maharashtra_regions.geojson'
+
+# Size of one grid cell in degrees (about 5.5 km)
+DEFAULT_CELL_SIZE = 0.05
+
+# Points are tested against polygon edges in blocks of this many to bound memory in batch mode
+BATCH_BLOCK_SIZE = 4096
+
+# Points closer than this to an edge (in degrees, well under a metre) are on the border
+BORDER_TOLERANCE = 1e-9
+
+
+def _polygon_rings(geometry):
+    """Return the rings (outer boundaries and holes) of a Polygon or MultiPolygon as arrays of (lon, lat)"""
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+    return [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon]
+
+
+def _points_inside(lons, lats, edges):
+    """Even-odd rule for many points against one polygon's edges (x1, y1, x2, y2); borders count as inside"""
+    x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    inside = np.zeros(len(lons), dtype=bool)
+    for start in range(0, len(lons), BATCH_BLOCK_SIZE):
+        x = lons[start:start + BATCH_BLOCK_SIZE, None]
+        y = lats[start:start + BATCH_BLOCK_SIZE, None]
+        straddles = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        crossings = np.count_nonzero(straddles & (x < x_cross), axis=1)
+        # The even-odd rule alone puts each border on one side only, so check the edges themselves
+        cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+        on_edge = ((np.abs(cross) <= BORDER_TOLERANCE * np.hypot(x2 - x1, y2 - y1)) &
+                   (x >= np.minimum(x1, x2) - BORDER_TOLERANCE) & (x <= np.maximum(x1, x2) + BORDER_TOLERANCE) &
+                   (y >= np.minimum(y1, y2) - BORDER_TOLERANCE) & (y <= np.maximum(y1, y2) + BORDER_TOLERANCE))
+        inside[start:start + BATCH_BLOCK_SIZE] = (crossings % 2 == 1) | on_edge.any(axis=1)
+    return inside
+
+
+class RegionResolver:
+    """Point-in-polygon lookups for Maharashtra regions and districts, backed by a grid index"""
+
+    def __init__(self, features, cell_size=DEFAULT_CELL_SIZE):
+        self.features = []
+        self.edges = []
+        bounds = []
+        for feature in features:
+            properties = feature.get('properties') or {}
+            rings = _polygon_rings(feature['geometry'])
+            self.features.append({
+                'region': properties.get('region'),
+                'name': properties.get('name') or properties.get('region'),
+                'district': properties.get('district')
+            })
+            # Every ring edge as one row: x1, y1, x2, y2
+            self.edges.append(np.vstack([np.hstack([ring[:-1], ring[1:]]) for ring in rings]))
+            points = np.vstack(rings)
+            bounds.append((points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()))
+
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.cell_size = cell_size
+        self.min_lon = self.bounds[:, 0].min()
+        self.min_lat = self.bounds[:, 1].min()
+        self.n_cols = int(np.ceil((self.bounds[:, 2].max() - self.min_lon) / cell_size)) + 1
+        self.n_rows = int(np.ceil((self.bounds[:, 3].max() - self.min_lat) / cell_size)) + 1
+        self._build_grid()
+
+    @classmethod
+    def from_file(cls, path, cell_size=DEFAULT_CELL_SIZE):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['features'], cell_size=cell_size)
+
+    def _build_grid(self):
+        n_cells = self.n_rows * self.n_cols
+        # candidates[p, cell] is True when polygon p's bounding box touches the cell
+        self.candidates = np.zeros((len(self.features), n_cells), dtype=bool)
+        # owner[cell] is the polygon that certainly contains the whole cell, or -1
+        self.owner = np.full(n_cells, -1, dtype=np.int32)
+        self.cell_lists = [[] for _ in range(n_cells)]
+
+        for p, (lon0, lat0, lon1, lat1) in enumerate(self.bounds):
+            col0, row0 = self._cell_of(lon0, lat0)
+            col1, row1 = self._cell_of(lon1, lat1)
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    cell = row * self.n_cols + col
+                    self.candidates[p, cell] = True
+                    self.cell_lists[cell].append(p)
+
+        for cell, polygons in enumerate(self.cell_lists):
+            if polygons and self._cell_inside(polygons[0], cell):
+                self.owner[cell] = polygons[0]
+
+    def _cell_of(self, lon, lat):
+        col = int((lon - self.min_lon) // self.cell_size)
+        row = int((lat - self.min_lat) // self.cell_size)
+        return min(max(col, 0), self.n_cols - 1), min(max(row, 0), self.n_rows - 1)
+
+    def _cell_inside(self, p, cell):
+        """True if the whole cell lies inside polygon p and no edge of p passes through it"""
+        row, col = divmod(cell, self.n_cols)
+        # Widened a little so an edge lying exactly on the cell's side (after rounding) still touches it
+        lon0 = self.min_lon + col * self.cell_size - BORDER_TOLERANCE
+        lat0 = self.min_lat + row * self.cell_size - BORDER_TOLERANCE
+        lon1, lat1 = lon0 + self.cell_size + 2 * BORDER_TOLERANCE, lat0 + self.cell_size + 2 * BORDER_TOLERANCE
+
+        edges = self.edges[p]
+        touches = ((np.minimum(edges[:, 0], edges[:, 2]) <= lon1) & (np.maximum(edges[:, 0], edges[:, 2]) >= lon0) &
+                   (np.minimum(edges[:, 1], edges[:, 3]) <= lat1) & (np.maximum(edges[:, 1], edges[:, 3]) >= lat0))
+        if touches.any():
+            return False
+        corners_lon = np.array([lon0, lon1, lon1, lon0])
+        corners_lat = np.array([lat0, lat0, lat1, lat1])
+        return bool(_points_inside(corners_lon, corners_lat, edges).all())
+
+    def _in_grid(self, lon, lat):
+        return (lon >= self.min_lon) & (lon < self.min_lon + self.n_cols * self.cell_size) & \
+               (lat >= self.min_lat) & (lat < self.min_lat + self.n_rows * self.cell_size)
+
+    def resolve(self, lat, lon):
+        """Return the feature (region, name, district) containing the point, or None"""
+        index = self.resolve_index(lat, lon)
+        return self.features[index] if index >= 0 else None
+
+    def resolve_index(self, lat, lon):
+        lat, lon = float(lat), float(lon)
+        if not self._in_grid(lon, lat):
+            return -1
+        col, row = self._cell_of(lon, lat)
+        cell = row * self.n_cols + col
+        if self.owner[cell] >= 0:
+            return int(self.owner[cell])
+        point_lon, point_lat = np.array([lon]), np.array([lat])
+        for p in self.cell_lists[cell]:
+            if _points_inside(point_lon, point_lat, self.edges[p])[0]:
+                return p
+        return -1
+
+    def resolve_many(self, lats, lons):
+        """Vectorised lookup for arrays of coordinates; returns feature indices (-1 = outside every polygon)"""
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        result = np.full(len(lats), -1, dtype=np.int32)
+
+        in_grid = self._in_grid(lons, lats)
+        cols = np.clip(((lons - self.min_lon) // self.cell_size).astype(np.int64), 0, self.n_cols - 1)
+        rows = np.clip(((lats - self.min_lat) // self.cell_size).astype(np.int64), 0, self.n_rows - 1)
+        cells = rows * self.n_cols + cols
+
+        # Cells owned by one polygon need no geometry at all
+        owned = in_grid & (self.owner[cells] >= 0)
+        result[owned] = self.owner[cells[owned]]
+
+        # The rest are tested against their cell's candidates, polygon by polygon in file order
+        pending = in_grid & ~owned
+        for p in range(len(self.features)):
+            mask = pending & self.candidates[p, cells]
+            if not mask.any():
+                continue
+            positions = np.flatnonzero(mask)
+            inside = _points_inside(lons[positions], lats[positions], self.edges[p])
+            result[positions[inside]] = p
+            pending[positions[inside]] = False
+        return result
+
+    def regions_for(self, indices):
+        """Turn feature indices from resolve_many into feature dicts (None where nothing matched)"""
+        return [self.features[i] if i >= 0 else None for i in indices]
@@ -7,7 +7,7 @@ import csv
 from datetime import datetime
 
 # Configuration (can be modified as needed)
-URL = "http://192.168.14.162/"
+URL = os.environ.get("PLANT_MONITOR_URL", "http://192.168.14.162/")
 CSV_FILE = "plant_data.csv"
 JSON_FILE = "plant_data.json"
 
@@ -0,0 +1,261 @@
+# Rolling statistics for sensor readings, kept in memory per device
+#
+# Every reading updates the sliding-window mean, min and max, an exponentially weighted
+# moving average (EWMA) and the rate of change for temperature, humidity and soil moisture.
+# Each update costs O(1) (amortised), no matter how many readings the window holds:
+#   - the mean comes from a running total
+#   - min and max come from monotonic queues
+#   - readings that fall out of the window are dropped from the front
+# Readings that look like sensor faults are flagged and kept out of the statistics.
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+FIELDS = ['temperature', 'humidity', 'soil_moisture']
+
+# Length of the sliding window
+DEFAULT_WINDOW_SECONDS = 24 * 60 * 60
+
+# Weight of the newest reading in the EWMA
+DEFAULT_EWMA_ALPHA = 0.1
+
+# Values outside these ranges can't come from a working sensor
+VALID_RANGES = {
+    'temperature': (-10.0, 60.0),  # °C
+    'humidity': (0.0, 100.0),  # %
+    'soil_moisture': (0.0, 255.0)  # raw board value
+}
+
+# A jump this far from the EWMA is flagged as a spike (the reading is still used)
+SPIKE_THRESHOLDS = {
+    'temperature': 10.0,
+    'humidity': 30.0,
+    'soil_moisture': 80.0
+}
+
+# Readings needed before spikes are checked, so the EWMA has settled
+SPIKE_WARMUP_READINGS = 5
+
+# How many recent anomalies are kept per device
+RECENT_ANOMALIES = 50
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_timestamp(value):
+    """Turn a reading's timestamp into epoch seconds; raises ValueError if it can't be read
+
+    Accepts "2025-05-13 11:21:21" (what plant_monitor.py writes), ISO-8601 such as
+    "2025-05-13T11:21:21Z" or "2025-05-13T11:21:21+05:30", and epoch seconds as a number.
+    Timestamps without a time zone are taken as local time.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Unrecognised timestamp: {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Unrecognised timestamp: {value!r}")
+    text = value.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        pass
+    try:
+        # fromisoformat doesn't take a trailing Z before Python 3.11
+        return datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text).timestamp()
+    except ValueError:
+        raise ValueError(f"Unrecognised timestamp: {value!r} (use ISO-8601, "
+                         f"'YYYY-MM-DD HH:MM:SS' or epoch seconds)") from None
+
+
+class RollingStat:
+    """Sliding-window mean/min/max, EWMA and rate of change for one value"""
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, alpha=DEFAULT_EWMA_ALPHA):
+        self.window_seconds = window_seconds
+        self.alpha = alpha
+        self.window = deque()  # (time, value), oldest first
+        self.total = 0.0
+        self.min_queue = deque()  # values increase from front to back
+        self.max_queue = deque()  # values decrease from front to back
+        self.ewma = None
+        self.count = 0
+        self.last = None  # (time, value)
+        self.rate_per_hour = None
+
+    def add(self, t, value):
+        if self.last is not None and t > self.last[0]:
+            self.rate_per_hour = (value - self.last[1]) / (t - self.last[0]) * 3600
+        self.last = (t, value)
+        self.count += 1
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+        self.window.append((t, value))
+        self.total += value
+        while self.min_queue and self.min_queue[-1][1] > value:
+            self.min_queue.pop()
+        self.min_queue.append((t, value))
+        while self.max_queue and self.max_queue[-1][1] < value:
+            self.max_queue.pop()
+        self.max_queue.append((t, value))
+        self.expire(t)
+
+    def expire(self, now):
+        """Drop readings older than the window"""
+        cutoff = now - self.window_seconds
+        while self.window and self.window[0][0] < cutoff:
+            _, old_value = self.window.popleft()
+            self.total -= old_value
+        while self.min_queue and self.min_queue[0][0] < cutoff:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < cutoff:
+            self.max_queue.popleft()
+
+    def summary(self, now=None):
+        """Statistics over the window that ends at `now` (default: the current time)
+
+        Readings that have gone out of the window since the last add are dropped here too, so a
+        device that stopped reporting doesn't keep showing day-old values. Not thread-safe on its
+        own; SensorAggregator calls it under its lock.
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+
+        count = len(self.window)
+        last_age = round(now - self.last[0], 1) if self.last else None
+        if not count:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None,
+                    'ewma': round(self.ewma, 3) if self.ewma is not None else None,
+                    'last': self.last[1] if self.last else None, 'last_age_seconds': last_age,
+                    'rate_per_hour': round(self.rate_per_hour, 3) if self.rate_per_hour is not None else None,
+                    'window_change': None}
+        return {
+            'count': count,
+            'mean': round(self.total / count, 3),
+            # The front of each monotonic queue is the window's min / max
+            'min': self.min_queue[0][1],
+            'max': self.max_queue[0][1],
+            'ewma': round(self.ewma, 3),
+            'last': self.last[1],
+            # Seconds since the newest reading, so clients can tell live values from old ones
+            'last_age_seconds': last_age,
+            'rate_per_hour': round(self.rate_per_hour, 3) if self.rate_per_hour is not None else None,
+            # Change from the oldest reading still in the window to the newest
+            'window_change': round(self.window[-1][1] - self.window[0][1], 3)
+        }
+
+
+def find_anomalies(reading, stats):
+    """Return the list of problems with one reading (empty if it looks fine)"""
+    anomalies = []
+    values = {field: reading.get(field) for field in FIELDS}
+
+    missing = [field for field, value in values.items() if value is None]
+    if missing:
+        anomalies.append({'type': 'missing', 'fields': missing})
+
+    present = {field: float(value) for field, value in values.items() if value is not None}
+    # A board that has lost its sensors reports zeros for everything
+    if len(present) == len(FIELDS) and all(value == 0 for value in present.values()):
+        anomalies.append({'type': 'all_zero', 'fields': list(FIELDS)})
+        return anomalies
+
+    for field, value in present.items():
+        low, high = VALID_RANGES[field]
+        if not low <= value <= high:
+            anomalies.append({'type': 'out_of_range', 'fields': [field], 'value': value})
+        elif stats[field].count >= SPIKE_WARMUP_READINGS and abs(value - stats[field].ewma) > SPIKE_THRESHOLDS[field]:
+            anomalies.append({'type': 'spike', 'fields': [field], 'value': value,
+                              'ewma': round(stats[field].ewma, 3)})
+    return anomalies
+
+
+class DeviceAggregate:
+    """Rolling statistics and anomaly history for one sensor device"""
+
+    def __init__(self, window_seconds, alpha):
+        self.stats = {field: RollingStat(window_seconds, alpha) for field in FIELDS}
+        self.readings = 0
+        self.rejected = 0
+        self.anomaly_counts = {}
+        self.recent_anomalies = deque(maxlen=RECENT_ANOMALIES)
+        self.last_timestamp = None
+        self.last_time = None
+        self.last_reported_time = None  # The reading's own time before any clamping, to spot repeats
+
+    def add(self, reading, t):
+        """Add a reading taken at epoch time t"""
+        self.last_reported_time = t
+        # Readings that arrive out of order are counted as if they arrived now
+        if self.last_time is not None and t < self.last_time:
+            t = self.last_time
+        self.last_time = t
+        timestamp = datetime.fromtimestamp(t).strftime(TIMESTAMP_FORMAT)
+        self.last_timestamp = timestamp
+        self.readings += 1
+
+        anomalies = find_anomalies(reading, self.stats)
+        for anomaly in anomalies:
+            self.anomaly_counts[anomaly['type']] = self.anomaly_counts.get(anomaly['type'], 0) + 1
+            self.recent_anomalies.append(dict(anomaly, timestamp=timestamp))
+
+        # Faulty readings would drag the statistics towards zero, so they are left out
+        faulty = {field for anomaly in anomalies if anomaly['type'] != 'spike' for field in anomaly['fields']}
+        if faulty:
+            self.rejected += 1
+        for field in FIELDS:
+            if field in faulty:
+                self.stats[field].expire(t)
+            else:
+                self.stats[field].add(t, float(reading[field]))
+        return anomalies
+
+    def summary(self, now=None):
+        return {
+            'last_timestamp': self.last_timestamp,
+            'readings': self.readings,
+            'rejected_readings': self.rejected,
+            'fields': {field: stat.summary(now) for field, stat in self.stats.items()},
+            'anomaly_counts': dict(self.anomaly_counts),
+            'recent_anomalies': list(self.recent_anomalies)
+        }
+
+
+class SensorAggregator:
+    """Keeps a DeviceAggregate per device; safe to use from several request threads"""
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, alpha=DEFAULT_EWMA_ALPHA):
+        self.window_seconds = window_seconds
+        self.alpha = alpha
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def add(self, device_id, reading):
+        """Add one reading; returns its anomalies, or None if the same reading was already added
+
+        Raises ValueError if the reading's timestamp can't be read (see parse_timestamp).
+        """
+        timestamp = reading.get('timestamp')
+        has_timestamp = timestamp is not None and timestamp != ''
+        t = parse_timestamp(timestamp) if has_timestamp else time.time()
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                device = self._devices[device_id] = DeviceAggregate(self.window_seconds, self.alpha)
+            # plant_data.json keeps the last reading until a new one replaces it
+            if has_timestamp and t == device.last_reported_time:
+                return None
+            return device.add(reading, t)
+
+    def summary(self, device_id=None):
+        now = time.time()
+        with self._lock:
+            if device_id is not None:
+                device = self._devices.get(device_id)
+                return {device_id: device.summary(now)} if device else {}
+            return {d: device.summary(now) for d, device in self._devices.items()}
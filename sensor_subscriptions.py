@@ -0,0 +1,188 @@
+# Keeps seed depth and spacing recommendations current for plots that follow a sensor
+#
+# Each plot subscribes to one sensor device with its fixed inputs (crop, region, season,
+# soil type and pH). When a reading arrives, temperature and moisture are rounded to a
+# step size, and only plots whose rounded inputs changed are re-predicted, all in one
+# batched model call. Updates are pushed to every listener queue (used by the SSE stream).
+import queue
+import threading
+from datetime import datetime
+
+# Readings closer together than this are treated as the same model input
+TEMPERATURE_STEP = 0.5  # °C
+MOISTURE_STEP = 1.0  # %
+
+# Inputs every subscription has to provide; temperature and moisture come from the sensor
+FIXED_FIELDS = ['crop_name', 'region', 'season', 'soil_type', 'soil_ph']
+
+# Slow listeners lose old updates instead of holding up the readings
+LISTENER_QUEUE_SIZE = 100
+
+
+def soil_moisture_percent(raw_value):
+    """Convert the board's raw 0-255 soil moisture reading to a 0-100% scale"""
+    raw_value = min(255, max(0, raw_value))
+    return round((raw_value / 255) * 100)
+
+
+def quantize(value, step):
+    return round(round(float(value) / step) * step, 4)
+
+
+class SubscriptionRegistry:
+    """Maps each sensor device to its plots and their latest recommendations"""
+
+    def __init__(self, predict_batch, temperature_step=TEMPERATURE_STEP, moisture_step=MOISTURE_STEP):
+        # predict_batch takes a list of form-style input dicts and returns one result per input
+        self.predict_batch = predict_batch
+        self.temperature_step = temperature_step
+        self.moisture_step = moisture_step
+        self._devices = {}  # device_id -> {plot_id: plot state}
+        self._last_readings = {}  # device_id -> (temperature, moisture) after rounding
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so batches started with the old models are not applied afterwards
+        self._generation = 0
+        self.stats = {'readings': 0, 'plots_recomputed': 0, 'plots_skipped': 0, 'model_calls': 0,
+                      'stale_batches': 0, 'plot_errors': 0}
+
+    def subscribe(self, device_id, plot_id, inputs):
+        """Add or replace a plot's subscription; returns its current recommendation (if a reading exists)"""
+        missing = [field for field in FIXED_FIELDS if field not in inputs]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        fixed = {field: inputs[field] for field in FIXED_FIELDS}
+        fixed['soil_ph'] = float(fixed['soil_ph'])
+
+        with self._lock:
+            self._devices.setdefault(device_id, {})[plot_id] = {
+                'inputs': fixed, 'key': None, 'result': None, 'error': None, 'updated_at': None
+            }
+            has_reading = device_id in self._last_readings
+
+        if has_reading:
+            self._recompute(device_id)
+        return self.get_plot(device_id, plot_id)
+
+    def unsubscribe(self, device_id, plot_id):
+        with self._lock:
+            plots = self._devices.get(device_id, {})
+            removed = plots.pop(plot_id, None) is not None
+            if not plots:
+                self._devices.pop(device_id, None)
+        return removed
+
+    def _plot_view(self, device_id, plot_id, plot):
+        return {'device_id': device_id, 'plot_id': plot_id, 'inputs': plot['inputs'],
+                'recommendation': plot['result'], 'error': plot['error'], 'updated_at': plot['updated_at']}
+
+    def get_plot(self, device_id, plot_id):
+        with self._lock:
+            plot = self._devices.get(device_id, {}).get(plot_id)
+            return self._plot_view(device_id, plot_id, plot) if plot else None
+
+    def get_results(self, device_id=None):
+        with self._lock:
+            device_ids = [device_id] if device_id is not None else list(self._devices)
+            return [self._plot_view(d, plot_id, plot)
+                    for d in device_ids for plot_id, plot in self._devices.get(d, {}).items()]
+
+    def ingest(self, device_id, temperature, moisture):
+        """Record a new reading and re-predict only the plots whose rounded inputs changed"""
+        reading = (quantize(temperature, self.temperature_step), quantize(moisture, self.moisture_step))
+        with self._lock:
+            self._last_readings[device_id] = reading
+            self.stats['readings'] += 1
+        return self._recompute(device_id)
+
+    def invalidate(self):
+        """Forget every cached recommendation (e.g. after the models change) and recompute them"""
+        with self._lock:
+            self._generation += 1
+            for plots in self._devices.values():
+                for plot in plots.values():
+                    plot['key'] = None
+            device_ids = list(self._last_readings)
+        for device_id in device_ids:
+            self._recompute(device_id)
+
+    def _recompute(self, device_id):
+        with self._lock:
+            reading = self._last_readings.get(device_id)
+            if reading is None:
+                return []
+            temperature, moisture = reading
+            # Plots whose rounded inputs are unchanged keep their recommendation
+            stale = [(plot_id, plot) for plot_id, plot in self._devices.get(device_id, {}).items()
+                     if plot['key'] != reading]
+            self.stats['plots_skipped'] += len(self._devices.get(device_id, {})) - len(stale)
+            if not stale:
+                return []
+            batch = [dict(plot['inputs'], temperature=temperature, moisture=moisture) for _, plot in stale]
+            generation = self._generation
+
+        # One batched model call for every plot that changed, made outside the lock
+        results, errors = self._predict(batch)
+
+        updates = []
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self.stats['model_calls'] += 1
+            # A newer reading (or a model swap) arrived while the models were running; its own
+            # recompute will publish the right results, so these would only overwrite them
+            if self._last_readings.get(device_id) != reading or self._generation != generation:
+                self.stats['stale_batches'] += 1
+                return []
+            self.stats['plots_recomputed'] += len(stale)
+            self.stats['plot_errors'] += sum(1 for error in errors if error)
+            for (plot_id, plot), result, error in zip(stale, results, errors):
+                # Skip plots that were removed or replaced while the models were running
+                if self._devices.get(device_id, {}).get(plot_id) is not plot:
+                    continue
+                plot['key'] = reading
+                plot['result'] = result
+                plot['error'] = error
+                plot['updated_at'] = now
+                updates.append(self._plot_view(device_id, plot_id, plot))
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            for update in updates:
+                try:
+                    listener.put_nowait(update)
+                except queue.Full:
+                    # Drop the oldest update so the newest one still gets through
+                    try:
+                        listener.get_nowait()
+                        listener.put_nowait(update)
+                    except (queue.Empty, queue.Full):
+                        pass
+        return updates
+
+    def _predict(self, batch):
+        """Predict the whole batch at once, or plot by plot if the batch fails"""
+        try:
+            return self.predict_batch(batch), [None] * len(batch)
+        except Exception:
+            # One bad plot (e.g. a crop retrained models no longer know) must not block the others
+            results, errors = [], []
+            for item in batch:
+                try:
+                    results.append(self.predict_batch([item])[0])
+                    errors.append(None)
+                except Exception as e:
+                    results.append(None)
+                    errors.append(str(e))
+            return results, errors
+
+    def listen(self):
+        """Return a queue that receives every published update"""
+        listener = queue.Queue(maxsize=LISTENER_QUEUE_SIZE)
+        with self._lock:
+            self._listeners.append(listener)
+        return listener
+
+    def unlisten(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
@@ -0,0 +1,178 @@
+# Per-region (or per-state) model shards, loaded on first use and kept under a memory budget
+#
+# ml_model.py --shard-by Region writes:
+#   model_shards/
+#       manifest.pkl            <- which column the shards are split by, the shared label encoders
+#                                  and one entry per shard (file name, training rows, size)
+#       Vidarbha.pkl            <- the three models trained on that region's rows only
+#       Western_Maharashtra.pkl
+#       ...
+# The app asks the cache for a region's shard. Shards are loaded the first time they are
+# needed and the least recently used ones are dropped when the budget is exceeded.
+# ml_model.py checks every shard against its golden inputs before publishing. The app repeats the
+# check for each shard when it first loads it; a shard that fails to load or to match its golden
+# inputs is reported in the metrics and its region is served by the global models instead.
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import model_registry
+
+SHARDS_DIR = 'model_shards'
+MANIFEST_FILE = 'manifest.pkl'
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def shard_file_name(value):
+    """File name for a shard, e.g. 'Western Maharashtra' -> 'Western_Maharashtra.pkl'"""
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(value)).strip('_') + '.pkl'
+
+
+class ShardCache:
+    """LRU cache of model shards with a memory budget and hit/load metrics"""
+
+    def __init__(self, shards_dir, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_MB * 2**20, golden_inputs=None):
+        self.shards_dir = shards_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        # The version's golden inputs, for manifests written before shards had their own
+        self.golden_inputs = golden_inputs or []
+        self.manifest = None
+        manifest_path = os.path.join(shards_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'rb') as f:
+                self.manifest = pickle.load(f)
+
+        self._resident = OrderedDict()  # shard key -> (models, size in bytes), least recently used first
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}  # shard key -> lock, so each shard is only loaded once at a time
+        self._broken = {}  # shard key -> error, for shards that failed to load (not retried)
+        self._metrics = {'requests': 0, 'hits': 0, 'loads': 0, 'fallbacks': 0, 'evictions': 0,
+                         'load_errors': 0, 'load_seconds_total': 0.0, 'load_seconds_max': 0.0}
+
+    @property
+    def shard_by(self):
+        return self.manifest['shard_by'] if self.manifest else None
+
+    @property
+    def input_field(self):
+        """Form field holding the value the shards are split by, e.g. 'Region' -> 'region'"""
+        if self.shard_by is None:
+            return None
+        fields = {column: field for field, column in model_registry.INPUT_FIELDS.items()}
+        return fields.get(self.shard_by, self.shard_by.lower())
+
+    def _golden_cases(self, key):
+        """The shard's own golden inputs, or else the version's golden inputs for its key
+
+        For the version's inputs the shard only has to predict something sensible, not the same values.
+        """
+        cases = self.manifest['shards'][key].get('golden_inputs')
+        if cases:
+            return cases
+        return [{'inputs': case['inputs']} for case in self.golden_inputs
+                if case['inputs'].get(self.input_field) == key]
+
+    def _load(self, key):
+        """Read one shard from disk and replay its golden inputs; raises if either fails"""
+        entry = self.manifest['shards'][key]
+        path = os.path.join(self.shards_dir, entry['file'])
+        with open(path, 'rb') as f:
+            models = pickle.load(f)
+        for name in ['seed_size_model', 'sowing_depth_model', 'spacing_model']:
+            if name not in models:
+                raise ValueError(f"Shard {key} is missing '{name}'")
+        cases = self._golden_cases(key)
+        if cases:
+            model_registry.check_golden_predictions(
+                f"Shard {key}", dict(models, label_encoders=self.manifest['label_encoders']), cases)
+        # The pickled size is a close enough stand-in for the memory a forest takes
+        return models, os.path.getsize(path)
+
+    def validate(self):
+        """Load every shard and replay its golden inputs; raises ValueError on the first broken shard
+
+        Used by ml_model.py before publishing. The app doesn't call it: it checks each shard on first use.
+        """
+        if self.manifest is None:
+            return
+        for key in self.manifest['shards']:
+            try:
+                self._load(key)
+            except Exception as e:
+                raise ValueError(f"Shard {key} failed validation: {str(e)}") from e
+
+    def has_shard(self, key):
+        return self.manifest is not None and key in self.manifest['shards']
+
+    def get(self, key):
+        """Return the shard's models for key, or None if there is no shard (use the global model)"""
+        with self._lock:
+            self._metrics['requests'] += 1
+            if not self.has_shard(key) or key in self._broken:
+                self._metrics['fallbacks'] += 1
+                return None
+            if key in self._resident:
+                self._metrics['hits'] += 1
+                self._resident.move_to_end(key)
+                return self._resident[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another request may have loaded it while this one waited
+            with self._lock:
+                if key in self._resident:
+                    self._metrics['hits'] += 1
+                    self._resident.move_to_end(key)
+                    return self._resident[key][0]
+
+            started = time.perf_counter()
+            try:
+                models, size = self._load(key)
+            except Exception as e:
+                # A damaged or mismatched shard must not break its region; serve the global models instead
+                with self._lock:
+                    self._broken[key] = str(e)
+                    self._metrics['load_errors'] += 1
+                    self._metrics['fallbacks'] += 1
+                return None
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._metrics['loads'] += 1
+                self._metrics['load_seconds_total'] += elapsed
+                self._metrics['load_seconds_max'] = max(self._metrics['load_seconds_max'], elapsed)
+                self._resident[key] = (models, size)
+                self._resident_bytes += size
+                self._evict(keep=key)
+            return models
+
+    def _evict(self, keep):
+        """Drop least recently used shards until the budget fits (the shard just loaded always stays)"""
+        while self._resident_bytes > self.memory_budget_bytes and len(self._resident) > 1:
+            key = next(iter(self._resident))
+            if key == keep:
+                self._resident.move_to_end(key)
+                continue
+            _, size = self._resident.pop(key)
+            self._resident_bytes -= size
+            self._metrics['evictions'] += 1
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            lookups = metrics['hits'] + metrics['loads']
+            metrics['hit_rate'] = round(metrics['hits'] / lookups, 4) if lookups else None
+            metrics['load_seconds_mean'] = round(metrics['load_seconds_total'] / metrics['loads'], 4) \
+                if metrics['loads'] else None
+            metrics['shard_by'] = self.shard_by
+            metrics['available_shards'] = sorted(self.manifest['shards']) if self.manifest else []
+            metrics['resident_shards'] = list(self._resident)
+            metrics['broken_shards'] = dict(self._broken)
+            metrics['resident_mb'] = round(self._resident_bytes / 2**20, 2)
+            metrics['memory_budget_mb'] = round(self.memory_budget_bytes / 2**20, 2)
+            return metrics
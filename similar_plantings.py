@@ -0,0 +1,84 @@
+# Nearest historical plantings from Maharashtra_Agriculture_Realistic.xlsx
+#
+# The index is built once by ml_model.py and saved next to the models. Rows are split by
+# crop and season, and each group gets its own KD-tree over temperature, moisture and pH,
+# so a query only searches the plantings that could possibly match.
+import numpy as np
+from sklearn.neighbors import KDTree
+
+SIMILAR_INDEX_FILE = 'similar_index.pkl'
+
+# Queries must match these exactly; neighbours are searched within the group
+PARTITION_COLUMNS = ['Crop Name', 'Season']
+# Neighbours are ranked by distance over these (after scaling each to unit standard deviation)
+DISTANCE_COLUMNS = ['Temperature (°C)', 'Moisture (%)', 'Soil pH']
+# Columns returned for every neighbour
+RESULT_COLUMNS = ['Crop Name', 'Region', 'Season', 'Temperature (°C)', 'Moisture (%)', 'Soil Type', 'Soil pH',
+                  'Seed Size Category', 'Sowing Depth (cm)', 'Spacing Between Seeds (cm)']
+
+DEFAULT_K = 5
+MAX_K = 50
+
+
+def build_similar_index(df, leaf_size=40):
+    """Build the per-partition KD-trees from the training DataFrame"""
+    # Scale so that one degree, one percent of moisture and one pH unit are not weighted arbitrarily
+    scale = df[DISTANCE_COLUMNS].std().replace(0, 1).fillna(1).to_numpy(dtype=float)
+
+    partitions = {}
+    for key, group in df.groupby(PARTITION_COLUMNS):
+        points = group[DISTANCE_COLUMNS].to_numpy(dtype=float) / scale
+        partitions[key] = {
+            'tree': KDTree(points, leaf_size=leaf_size),
+            'rows': group[RESULT_COLUMNS].to_dict('records')
+        }
+    return SimilarPlantingsIndex(partitions, scale)
+
+
+class SimilarPlantingsIndex:
+    """Top-k nearest historical rows for a crop/season and its growing conditions"""
+
+    def __init__(self, partitions, scale):
+        self.partitions = partitions
+        self.scale = scale
+
+    def __len__(self):
+        return sum(len(partition['rows']) for partition in self.partitions.values())
+
+    def _neighbours(self, partition, distances, indices):
+        rows = partition['rows']
+        return [dict(rows[i], distance=round(float(d), 4)) for d, i in zip(distances, indices)]
+
+    def query(self, crop_name, season, temperature, moisture, soil_ph, k=DEFAULT_K):
+        """Return up to k nearest rows (closest first) with their scaled distance"""
+        partition = self.partitions.get((crop_name, season))
+        if partition is None:
+            return []
+        k = min(k, len(partition['rows']))
+        point = np.array([[temperature, moisture, soil_ph]], dtype=float) / self.scale
+        distances, indices = partition['tree'].query(point, k=k)
+        return self._neighbours(partition, distances[0], indices[0])
+
+    def query_batch(self, queries, k=DEFAULT_K):
+        """Answer many queries, with one tree search per crop/season group
+
+        Each query is a dict with crop_name, season, temperature, moisture and soil_ph.
+        Results come back in the same order as the queries.
+        """
+        results = [[] for _ in queries]
+
+        # Group the queries by partition so every tree is searched once with all of its points
+        grouped = {}
+        for position, item in enumerate(queries):
+            grouped.setdefault((item['crop_name'], item['season']), []).append(position)
+
+        for key, positions in grouped.items():
+            partition = self.partitions.get(key)
+            if partition is None:
+                continue
+            points = np.array([[float(queries[p]['temperature']), float(queries[p]['moisture']),
+                                float(queries[p]['soil_ph'])] for p in positions], dtype=float) / self.scale
+            distances, indices = partition['tree'].query(points, k=min(k, len(partition['rows'])))
+            for row_number, position in enumerate(positions):
+                results[position] = self._neighbours(partition, distances[row_number], indices[row_number])
+        return results
@@ -0,0 +1,100 @@
+# Tests for the model registry: CURRENT/HISTORY handling and validated rollback
+import json
+import pickle
+
+import pytest
+
+import model_registry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    for version in ['v1', 'v2', 'v3']:
+        (tmp_path / version).mkdir()
+    return str(tmp_path)
+
+
+def test_set_current_records_history(registry):
+    model_registry.set_current_version(registry, 'v1')
+    model_registry.set_current_version(registry, 'v2')
+    model_registry.set_current_version(registry, 'v2')
+    assert model_registry.get_current_version(registry) == 'v2'
+    assert model_registry.get_history(registry) == ['v1', 'v2']
+    with pytest.raises(ValueError):
+        model_registry.set_current_version(registry, 'v9')
+
+
+def test_rollback_steps_back_through_history(registry):
+    for version in ['v1', 'v2', 'v3']:
+        model_registry.set_current_version(registry, version)
+
+    assert model_registry.rollback(registry) == 'v2'
+    assert model_registry.get_current_version(registry) == 'v2'
+    assert model_registry.get_history(registry) == ['v1', 'v2']
+
+    assert model_registry.rollback(registry) == 'v1'
+    assert model_registry.get_history(registry) == ['v1']
+    with pytest.raises(ValueError):
+        model_registry.rollback(registry)
+    assert model_registry.get_current_version(registry) == 'v1'
+
+
+def test_rollback_to_named_version(registry):
+    model_registry.set_current_version(registry, 'v1')
+    model_registry.set_current_version(registry, 'v3')
+
+    assert model_registry.rollback(registry, 'v2') == 'v2'
+    assert model_registry.get_current_version(registry) == 'v2'
+    assert model_registry.get_history(registry) == ['v1', 'v3', 'v2']
+    # Rolling back again returns to the version served before the named rollback
+    assert model_registry.rollback(registry) == 'v3'
+    with pytest.raises(ValueError):
+        model_registry.rollback(registry, 'v9')
+
+
+def publish_fake_version(registry_dir, name, golden):
+    """A version folder whose 'models' only pass validation when golden is True"""
+    version_dir = registry_dir / name
+    version_dir.mkdir()
+    with open(version_dir / model_registry.MODELS_FILE, 'wb') as f:
+        pickle.dump({'ok': golden}, f)
+    with open(version_dir / model_registry.UNIQUE_VALUES_FILE, 'wb') as f:
+        pickle.dump({}, f)
+    (version_dir / model_registry.GOLDEN_FILE).write_text(json.dumps([]))
+
+
+def check_models(bundle):
+    if not bundle['models']['ok']:
+        raise ValueError("golden mismatch")
+
+
+def test_rollback_leaves_pointer_alone_when_validation_fails(tmp_path):
+    publish_fake_version(tmp_path, 'v1', golden=False)
+    publish_fake_version(tmp_path, 'v2', golden=True)
+    registry = str(tmp_path)
+    model_registry.set_current_version(registry, 'v1')
+    model_registry.set_current_version(registry, 'v2')
+
+    with pytest.raises(ValueError, match='v1 failed validation'):
+        model_registry.rollback(registry, validate=check_models)
+    assert model_registry.get_current_version(registry) == 'v2'
+    assert model_registry.get_history(registry) == ['v1', 'v2']
+
+
+def test_watcher_rollback_swaps_only_validated_versions(tmp_path):
+    for name, golden in [('v1', True), ('v2', False), ('v3', True)]:
+        publish_fake_version(tmp_path, name, golden)
+    registry = str(tmp_path)
+    for name in ['v1', 'v3']:
+        model_registry.set_current_version(registry, name)
+
+    served = []
+    watcher = model_registry.RegistryWatcher(registry, on_load=lambda bundle: served.append(bundle['version']),
+                                             loaded_version='v3', validate=check_models)
+    with pytest.raises(ValueError):
+        watcher.rollback('v2')
+    assert served == [] and model_registry.get_current_version(registry) == 'v3'
+
+    assert watcher.rollback() == 'v1'
+    assert served == ['v1'] and watcher.loaded_version == 'v1'
+    assert model_registry.get_current_version(registry) == 'v1'
@@ -0,0 +1,76 @@
+# Tests for the region resolver
+import os
+
+import numpy as np
+import pytest
+
+from region_resolver import RegionResolver, REGIONS_FILE, _points_inside
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def resolver():
+    return RegionResolver.from_file(os.path.join(ROOT_DIR, REGIONS_FILE))
+
+
+def brute_force_owner(resolver, lats, lons):
+    """First polygon in file order that contains each point, or -1"""
+    result = np.full(len(lats), -1, dtype=np.int32)
+    for p in reversed(range(len(resolver.features))):
+        result[_points_inside(lons, lats, resolver.edges[p])] = p
+    return result
+
+
+def test_grid_matches_brute_force(resolver):
+    rng = np.random.default_rng(0)
+    # Random points plus every point of a 0.05 degree lattice, which lands on all the borders
+    lat_grid, lon_grid = np.meshgrid(np.round(np.arange(15.0, 22.6, 0.05), 4), np.round(np.arange(72.0, 81.1, 0.05), 4))
+    lats = np.concatenate([rng.uniform(15.0, 22.5, 20000), lat_grid.ravel()])
+    lons = np.concatenate([rng.uniform(72.0, 81.0, 20000), lon_grid.ravel()])
+
+    expected = brute_force_owner(resolver, lats, lons)
+    assert np.array_equal(resolver.resolve_many(lats, lons), expected)
+    for i in rng.choice(len(lats), 2000, replace=False):
+        assert resolver.resolve_index(lats[i], lons[i]) == expected[i]
+
+
+def test_owned_cells_are_inside_their_polygon(resolver):
+    for cell in np.flatnonzero(resolver.owner >= 0):
+        p = resolver.owner[cell]
+        assert resolver.candidates[p, cell]
+        assert resolver.cell_lists[cell][0] == p
+
+
+# District headquarters and towns near the division borders
+@pytest.mark.parametrize('lat, lon, region', [
+    (18.96, 72.82, 'Konkan'),               # Mumbai
+    (16.99, 73.30, 'Konkan'),               # Ratnagiri
+    (18.79, 73.34, 'Konkan'),               # Khopoli, just below the ghat
+    (18.75, 73.41, 'Western Maharashtra'),  # Lonavala, just above it
+    (18.52, 73.86, 'Western Maharashtra'),  # Pune
+    (17.66, 75.91, 'Western Maharashtra'),  # Solapur
+    (18.23, 75.69, 'Western Maharashtra'),  # Barshi
+    (16.70, 74.24, 'Western Maharashtra'),  # Kolhapur
+    (19.99, 73.79, 'North Maharashtra'),    # Nashik
+    (21.00, 75.56, 'North Maharashtra'),    # Jalgaon
+    (19.09, 74.74, 'North Maharashtra'),    # Ahmednagar
+    (19.77, 74.48, 'North Maharashtra'),    # Shirdi
+    (19.88, 75.34, 'Marathwada'),           # Aurangabad
+    (19.84, 75.88, 'Marathwada'),           # Jalna
+    (18.40, 76.57, 'Marathwada'),           # Latur
+    (19.15, 77.31, 'Marathwada'),           # Nanded
+    (19.62, 78.20, 'Marathwada'),           # Kinwat
+    (21.15, 79.09, 'Vidarbha'),             # Nagpur
+    (19.95, 79.30, 'Vidarbha'),             # Chandrapur
+    (21.46, 80.19, 'Vidarbha'),             # Gondia
+    (20.18, 80.00, 'Vidarbha'),             # Gadchiroli
+    (20.02, 76.03, 'Vidarbha'),             # Deulgaon Raja
+    (19.60, 77.69, 'Vidarbha'),             # Umarkhed
+    (20.37, 72.90, None),                   # Vapi, Gujarat
+    (17.91, 77.52, None),                   # Bidar, Karnataka
+    (19.67, 78.53, None),                   # Adilabad, Telangana
+])
+def test_towns_resolve_to_their_division(resolver, lat, lon, region):
+    feature = resolver.resolve(lat, lon)
+    assert (feature['region'] if feature else None) == region
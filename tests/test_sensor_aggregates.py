@@ -0,0 +1,59 @@
+# Tests for the rolling sensor statistics
+import random
+
+import pytest
+
+from sensor_aggregates import RollingStat, parse_timestamp
+
+
+def brute_force_window(readings, now, window_seconds):
+    return [value for t, value in readings if t >= now - window_seconds]
+
+
+def test_rolling_stat_matches_brute_force():
+    random.seed(1)
+    stat = RollingStat(window_seconds=60)
+    readings = []
+    t = 0.0
+    for _ in range(500):
+        t += random.uniform(0, 20)
+        value = round(random.uniform(-5, 40), 2)
+        stat.add(t, value)
+        readings.append((t, value))
+
+        window = brute_force_window(readings, t, 60)
+        summary = stat.summary(now=t)
+        assert summary['count'] == len(window)
+        assert summary['min'] == min(window)
+        assert summary['max'] == max(window)
+        assert summary['mean'] == pytest.approx(sum(window) / len(window), abs=1e-3)
+
+
+def test_window_expires_without_new_readings():
+    stat = RollingStat(window_seconds=100)
+    for t, value in [(0, 5.0), (10, 1.0), (50, 9.0), (60, 3.0)]:
+        stat.add(t, value)
+
+    summary = stat.summary(now=115)
+    # (0, 5) and (10, 1) are out of the window at t=115
+    assert (summary['count'], summary['min'], summary['max'], summary['mean']) == (2, 3.0, 9.0, 6.0)
+    assert summary['last_age_seconds'] == 55
+
+    summary = stat.summary(now=500)
+    assert summary['count'] == 0 and summary['mean'] is None and summary['min'] is None
+    # The summary drops the expired readings, so the next one doesn't walk them again
+    assert len(stat.window) == len(stat.min_queue) == len(stat.max_queue) == 0
+    stat.add(500, 7.0)
+    assert len(stat.window) == 1 and stat.summary(now=500)['min'] == 7.0
+
+
+def test_parse_timestamp_formats():
+    local = parse_timestamp("2025-05-13 11:21:21")
+    assert parse_timestamp("2025-05-13T11:21:21") == local
+    assert parse_timestamp("2025-05-13T11:21:21Z") == 1747135281.0
+    assert parse_timestamp("2025-05-13T16:51:21+05:30") == 1747135281.0
+    assert parse_timestamp(1747135281) == 1747135281.0
+    assert parse_timestamp("1747135281.5") == 1747135281.5
+    for bad in ["yesterday", "", [1], True, None]:
+        with pytest.raises(ValueError):
+            parse_timestamp(bad)
@@ -0,0 +1,139 @@
+# Tests for the sensor subscription registry
+import threading
+
+import pytest
+
+from sensor_subscriptions import SubscriptionRegistry
+
+PLOT = {'crop_name': 'Wheat', 'region': 'Vidarbha', 'season': 'Rabi', 'soil_type': 'Black', 'soil_ph': '6.5'}
+
+
+class FakeModels:
+    """Stands in for the batched model call and records every batch it gets"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        for item in batch:
+            if item['crop_name'] == 'Unknown':
+                raise ValueError("unknown crop")
+        return [{'temperature': item['temperature'], 'moisture': item['moisture']} for item in batch]
+
+
+def test_small_changes_skip_the_model():
+    models = FakeModels()
+    registry = SubscriptionRegistry(models)
+    registry.subscribe('dev1', 'plot1', PLOT)
+    registry.subscribe('dev1', 'plot2', dict(PLOT, crop_name='Rice'))
+
+    assert len(registry.ingest('dev1', 25.1, 40.2)) == 2
+    # Rounds to the same 0.5 °C / 1 % step, so nothing is predicted again
+    assert registry.ingest('dev1', 24.9, 39.8) == []
+    assert len(models.batches) == 1 and len(models.batches[0]) == 2
+
+    updates = registry.ingest('dev1', 26.0, 40.0)
+    assert len(updates) == 2 and updates[0]['recommendation'] == {'temperature': 26.0, 'moisture': 40.0}
+    assert registry.stats['plots_skipped'] == 2 and registry.stats['plots_recomputed'] == 4
+    assert registry.stats['model_calls'] == 2
+
+
+def test_subscribe_after_a_reading_predicts_only_the_new_plot():
+    models = FakeModels()
+    registry = SubscriptionRegistry(models)
+    registry.subscribe('dev1', 'plot1', PLOT)
+    registry.ingest('dev1', 25.0, 40.0)
+
+    view = registry.subscribe('dev1', 'plot2', dict(PLOT, season='Kharif'))
+    assert view['recommendation'] == {'temperature': 25.0, 'moisture': 40.0}
+    assert [len(batch) for batch in models.batches] == [1, 1]
+
+
+def test_missing_fields_are_rejected():
+    registry = SubscriptionRegistry(FakeModels())
+    with pytest.raises(ValueError, match='soil_ph'):
+        registry.subscribe('dev1', 'plot1', {k: v for k, v in PLOT.items() if k != 'soil_ph'})
+
+
+def test_batch_from_an_older_reading_is_dropped():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def predict(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+        return [{'temperature': item['temperature']} for item in batch]
+
+    registry = SubscriptionRegistry(predict)
+    registry.subscribe('dev1', 'plot1', PLOT)
+    old = threading.Thread(target=registry.ingest, args=('dev1', 20.0, 30.0))
+    old.start()
+    assert started.wait(5)
+
+    # A newer reading is predicted and applied while the first batch is still running
+    assert len(registry.ingest('dev1', 30.0, 60.0)) == 1
+    release.set()
+    old.join(5)
+
+    assert registry.get_plot('dev1', 'plot1')['recommendation'] == {'temperature': 30.0}
+    assert registry.stats['stale_batches'] == 1 and registry.stats['plots_recomputed'] == 1
+
+
+def test_invalidate_drops_batches_started_with_the_old_models():
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def predict(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            return [{'models': 'old'}] * len(batch)
+        return [{'models': 'new'}] * len(batch)
+
+    registry = SubscriptionRegistry(predict)
+    registry.subscribe('dev1', 'plot1', PLOT)
+    old = threading.Thread(target=registry.ingest, args=('dev1', 20.0, 30.0))
+    old.start()
+    assert started.wait(5)
+
+    # The new models answer before the old batch finishes
+    registry.invalidate()
+    release.set()
+    old.join(5)
+
+    assert registry.get_plot('dev1', 'plot1')['recommendation'] == {'models': 'new'}
+    assert registry.stats['stale_batches'] == 1
+
+
+def test_one_failing_plot_does_not_block_the_others():
+    models = FakeModels()
+    registry = SubscriptionRegistry(models)
+    registry.subscribe('dev1', 'good', PLOT)
+    registry.subscribe('dev1', 'bad', dict(PLOT, crop_name='Unknown'))
+
+    updates = {u['plot_id']: u for u in registry.ingest('dev1', 25.0, 40.0)}
+    assert updates['good']['recommendation'] == {'temperature': 25.0, 'moisture': 40.0}
+    assert updates['good']['error'] is None
+    assert updates['bad']['recommendation'] is None and 'unknown crop' in updates['bad']['error']
+    assert registry.stats['plot_errors'] == 1
+
+    # The failed plot is not retried until its inputs change
+    assert registry.ingest('dev1', 25.1, 40.1) == []
+
+
+def test_listeners_get_every_update():
+    registry = SubscriptionRegistry(FakeModels())
+    listener = registry.listen()
+    registry.subscribe('dev1', 'plot1', PLOT)
+    registry.ingest('dev1', 25.0, 40.0)
+    assert listener.get_nowait()['plot_id'] == 'plot1'
+
+    registry.unlisten(listener)
+    registry.ingest('dev1', 30.0, 40.0)
+    assert listener.empty()
@@ -0,0 +1,161 @@
+# Tests for the per-region model shard cache
+import os
+import pickle
+
+import pytest
+from sklearn.dummy import DummyClassifier, DummyRegressor
+from sklearn.preprocessing import LabelEncoder
+
+import model_registry
+from shard_cache import MANIFEST_FILE, ShardCache, shard_file_name
+
+REGIONS = ['Konkan', 'Marathwada', 'Vidarbha', 'Western Maharashtra']
+LABEL_ENCODERS = {column: LabelEncoder().fit(values) for column, values in {
+    'Crop Name': ['Rice', 'Wheat'],
+    'Region': REGIONS,
+    'Season': ['Kharif', 'Rabi'],
+    'Soil Type': ['Black', 'Red'],
+    'Seed Size Category': ['Large', 'Medium', 'Small'],
+}.items()}
+
+
+def sample_input(region):
+    return {'crop_name': 'Rice', 'region': region, 'season': 'Kharif', 'temperature': 25.0,
+            'moisture': 50.0, 'soil_type': 'Black', 'soil_ph': 6.5}
+
+
+def shard_models(depth, padding_bytes):
+    """Constant models; the padding makes the pickled shard about padding_bytes big"""
+    X = [[0] * len(model_registry.FEATURE_COLUMNS)] * 2
+    return {
+        'seed_size_model': DummyClassifier(strategy='most_frequent').fit(X, [0, 0]),
+        'sowing_depth_model': DummyRegressor(strategy='constant', constant=depth).fit(X, [depth, depth]),
+        'spacing_model': DummyRegressor(strategy='constant', constant=10.0).fit(X, [10.0, 10.0]),
+        'padding': b'x' * padding_bytes
+    }
+
+
+def write_shards(shards_dir, padding_bytes=1000):
+    """Save one shard per region, each with golden inputs recorded from its own models"""
+    os.makedirs(shards_dir)
+    manifest = {'shard_by': 'Region', 'label_encoders': LABEL_ENCODERS, 'shards': {}}
+    for depth, region in enumerate(REGIONS, start=1):
+        models = shard_models(float(depth), padding_bytes)
+        file_name = shard_file_name(region)
+        with open(os.path.join(shards_dir, file_name), 'wb') as f:
+            pickle.dump(models, f)
+        manifest['shards'][region] = {
+            'file': file_name,
+            'golden_inputs': model_registry.make_golden_inputs(dict(models, label_encoders=LABEL_ENCODERS),
+                                                               [sample_input(region)])
+        }
+    with open(os.path.join(shards_dir, MANIFEST_FILE), 'wb') as f:
+        pickle.dump(manifest, f)
+    return manifest
+
+
+@pytest.fixture
+def shards_dir(tmp_path):
+    path = str(tmp_path / 'model_shards')
+    write_shards(path)
+    return path
+
+
+def test_shards_load_on_first_use_and_count_hits(shards_dir):
+    cache = ShardCache(shards_dir)
+    assert cache.metrics()['resident_shards'] == []
+
+    assert cache.get('Konkan')['sowing_depth_model'].constant == 1.0
+    assert cache.get('Konkan') is cache.get('Konkan')
+    assert cache.get('Vidarbha')['sowing_depth_model'].constant == 3.0
+    assert cache.get('Gujarat') is None
+
+    metrics = cache.metrics()
+    assert (metrics['requests'], metrics['hits'], metrics['loads'], metrics['fallbacks']) == (5, 2, 2, 1)
+    assert metrics['hit_rate'] == 0.5
+    assert metrics['resident_shards'] == ['Konkan', 'Vidarbha']
+    assert cache.input_field == 'region'
+
+
+def test_least_recently_used_shard_is_evicted(shards_dir):
+    shard_bytes = os.path.getsize(os.path.join(shards_dir, shard_file_name('Konkan')))
+    cache = ShardCache(shards_dir, memory_budget_bytes=2.5 * shard_bytes)
+
+    cache.get('Konkan')
+    cache.get('Marathwada')
+    cache.get('Konkan')  # Marathwada is now the least recently used
+    cache.get('Vidarbha')
+
+    metrics = cache.metrics()
+    assert metrics['resident_shards'] == ['Konkan', 'Vidarbha']
+    assert metrics['evictions'] == 1
+    assert metrics['resident_mb'] * 2**20 <= 2.5 * shard_bytes + 0.01 * 2**20
+
+    # An evicted shard is loaded again when it is needed
+    assert cache.get('Marathwada') is not None
+    assert cache.metrics()['loads'] == 4
+
+
+def test_shard_bigger_than_the_budget_still_serves(shards_dir):
+    cache = ShardCache(shards_dir, memory_budget_bytes=1)
+    assert cache.get('Konkan') is not None
+    assert cache.get('Vidarbha') is not None
+    assert cache.metrics()['resident_shards'] == ['Vidarbha']
+
+
+def test_unreadable_shard_falls_back_and_is_not_retried(shards_dir):
+    with open(os.path.join(shards_dir, shard_file_name('Konkan')), 'wb') as f:
+        f.write(b'not a pickle')
+    cache = ShardCache(shards_dir)
+
+    assert cache.get('Konkan') is None
+    assert cache.get('Konkan') is None
+    assert cache.get('Vidarbha') is not None
+
+    metrics = cache.metrics()
+    assert metrics['load_errors'] == 1 and metrics['fallbacks'] == 2
+    assert list(metrics['broken_shards']) == ['Konkan']
+    with pytest.raises(ValueError, match='Shard Konkan'):
+        cache.validate()
+
+
+def test_shard_that_misses_its_golden_inputs_is_not_served(shards_dir):
+    # Swap two shard files: both still load, but predict the other region's values
+    konkan = os.path.join(shards_dir, shard_file_name('Konkan'))
+    vidarbha = os.path.join(shards_dir, shard_file_name('Vidarbha'))
+    os.rename(konkan, konkan + '.tmp')
+    os.rename(vidarbha, konkan)
+    os.rename(konkan + '.tmp', vidarbha)
+    cache = ShardCache(shards_dir)
+
+    assert cache.get('Konkan') is None and cache.get('Vidarbha') is None
+    assert cache.get('Marathwada')['sowing_depth_model'].constant == 2.0
+    metrics = cache.metrics()
+    assert sorted(metrics['broken_shards']) == ['Konkan', 'Vidarbha']
+    assert 'sowing_depth' in metrics['broken_shards']['Konkan']
+    assert metrics['resident_shards'] == ['Marathwada']
+
+
+def test_creating_the_cache_loads_no_shards(shards_dir):
+    # Startup and model swaps only read the manifest; a broken shard only matters once it is asked for
+    os.remove(os.path.join(shards_dir, shard_file_name('Vidarbha')))
+    cache = ShardCache(shards_dir)
+    assert cache.metrics()['loads'] == 0 and cache.metrics()['broken_shards'] == {}
+    assert cache.get('Konkan') is not None
+    assert cache.get('Vidarbha') is None
+
+
+def test_version_golden_inputs_are_used_for_older_manifests(shards_dir):
+    manifest_path = os.path.join(shards_dir, MANIFEST_FILE)
+    with open(manifest_path, 'rb') as f:
+        manifest = pickle.load(f)
+    for entry in manifest['shards'].values():
+        del entry['golden_inputs']
+    manifest['label_encoders'] = dict(LABEL_ENCODERS, Region=LabelEncoder().fit(['Konkan']))
+    with open(manifest_path, 'wb') as f:
+        pickle.dump(manifest, f)
+
+    # The version's golden input for Vidarbha can't be encoded with these label encoders
+    cache = ShardCache(shards_dir, golden_inputs=[{'inputs': sample_input('Vidarbha')}])
+    assert cache.get('Vidarbha') is None
+    assert cache.get('Konkan') is not None
@@ -0,0 +1,79 @@
+# Tests for the similar plantings index
+import numpy as np
+import pandas as pd
+import pytest
+
+from similar_plantings import DISTANCE_COLUMNS, build_similar_index
+
+
+@pytest.fixture(scope='module')
+def plantings():
+    rng = np.random.default_rng(0)
+    n = 600
+    return pd.DataFrame({
+        'Crop Name': rng.choice(['Wheat', 'Rice', 'Cotton'], n),
+        'Region': rng.choice(['Vidarbha', 'Konkan'], n),
+        'Season': rng.choice(['Kharif', 'Rabi'], n),
+        'Temperature (°C)': rng.uniform(15, 40, n).round(2),
+        'Moisture (%)': rng.uniform(10, 90, n).round(2),
+        'Soil Type': rng.choice(['Black', 'Red'], n),
+        'Soil pH': rng.uniform(5, 8.5, n).round(2),
+        'Seed Size Category': rng.choice(['Small', 'Medium', 'Large'], n),
+        'Sowing Depth (cm)': rng.uniform(1, 6, n).round(1),
+        'Spacing Between Seeds (cm)': rng.uniform(5, 60, n).round(1),
+    })
+
+
+def brute_force(df, crop_name, season, temperature, moisture, soil_ph, k):
+    """The k nearest rows of the crop/season, found by measuring every one of them"""
+    scale = df[DISTANCE_COLUMNS].std().to_numpy(dtype=float)
+    group = df[(df['Crop Name'] == crop_name) & (df['Season'] == season)]
+    points = group[DISTANCE_COLUMNS].to_numpy(dtype=float) / scale
+    distances = np.linalg.norm(points - np.array([temperature, moisture, soil_ph]) / scale, axis=1)
+    order = np.argsort(distances)[:k]
+    return [(group.index[i], round(float(distances[i]), 4)) for i in order], group
+
+
+def as_pairs(results, group):
+    # Map each neighbour back to its DataFrame row by its values
+    keys = {tuple(row): index for index, row in zip(group.index, group[DISTANCE_COLUMNS].itertuples(index=False))}
+    return [(keys[tuple(r[c] for c in DISTANCE_COLUMNS)], r['distance']) for r in results]
+
+
+def random_queries(rng, count):
+    return [{'crop_name': str(rng.choice(['Wheat', 'Rice', 'Cotton'])), 'season': str(rng.choice(['Kharif', 'Rabi'])),
+             'temperature': rng.uniform(10, 45), 'moisture': rng.uniform(0, 100), 'soil_ph': rng.uniform(4.5, 9)}
+            for _ in range(count)]
+
+
+def test_query_matches_brute_force(plantings):
+    index = build_similar_index(plantings)
+    rng = np.random.default_rng(1)
+    for q in random_queries(rng, 50):
+        for k in (1, 5, 20):
+            expected, group = brute_force(plantings, q['crop_name'], q['season'], q['temperature'],
+                                          q['moisture'], q['soil_ph'], k)
+            results = index.query(q['crop_name'], q['season'], q['temperature'], q['moisture'], q['soil_ph'], k=k)
+            assert as_pairs(results, group) == expected
+            assert all(r['Crop Name'] == q['crop_name'] and r['Season'] == q['season'] for r in results)
+
+
+def test_query_batch_matches_single_queries(plantings):
+    index = build_similar_index(plantings)
+    queries = random_queries(np.random.default_rng(2), 80)
+    queries.append({'crop_name': 'Sugarcane', 'season': 'Kharif', 'temperature': 30, 'moisture': 50, 'soil_ph': 7})
+
+    batch = index.query_batch(queries, k=7)
+    assert len(batch) == len(queries)
+    for q, results in zip(queries, batch):
+        assert results == index.query(q['crop_name'], q['season'], q['temperature'], q['moisture'], q['soil_ph'], k=7)
+    assert batch[-1] == []
+
+
+def test_k_larger_than_the_group(plantings):
+    index = build_similar_index(plantings)
+    size = len(plantings[(plantings['Crop Name'] == 'Rice') & (plantings['Season'] == 'Rabi')])
+    results = index.query('Rice', 'Rabi', 25, 50, 6.5, k=size + 10)
+    assert len(results) == size
+    assert [r['distance'] for r in results] == sorted(r['distance'] for r in results)
+    assert len(index) == len(plantings)
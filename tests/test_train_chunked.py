@@ -0,0 +1,85 @@
+# Tests for the out-of-core training script
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+import train_chunked
+from train_chunked import (SOURCE_COLUMNS, collect_categories, fit_label_encoders, forest_node_bytes,
+                           leaf_size_within)
+
+
+def make_records(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    records = pd.DataFrame({
+        'Crop Name': rng.choice(['Wheat', 'Rice', 'Cotton', 'Soybean'], rows),
+        'Region': rng.choice(['Vidarbha', 'Konkan', 'Marathwada'], rows),
+        'Season': rng.choice(['Kharif', 'Rabi'], rows),
+        'Temperature (°C)': rng.uniform(15, 40, rows).round(2),
+        'Moisture (%)': rng.uniform(10, 90, rows).round(2),
+        'Soil Type': rng.choice(['Black', 'Red', 'Laterite'], rows),
+        'Soil pH': rng.uniform(5, 8.5, rows).round(2),
+        'Seed Size Category': rng.choice(['Small', 'Medium', 'Large'], rows),
+    })
+    records['Sowing Depth (cm)'] = (records['Temperature (°C)'] / 10).round(1)
+    records['Spacing Between Seeds (cm)'] = (records['Moisture (%)'] / 2).round(1)
+    return records[SOURCE_COLUMNS]
+
+
+def run_main(monkeypatch, tmp_path, records, *args):
+    """Run the script on records in tmp_path and return the saved models"""
+    source = tmp_path / 'records.csv'
+    records.to_csv(source, index=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['train_chunked.py', '--source', str(source), *args])
+    train_chunked.main()
+    with open(tmp_path / 'agricultural_models.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+def test_encoders_are_fitted_on_the_union_of_chunks(tmp_path):
+    records = make_records(300)
+    # Later chunks bring categories the first chunk never saw
+    records.loc[250:, 'Crop Name'] = 'Sugarcane'
+    records.loc[280:, 'Soil Type'] = 'Alluvial'
+    source = tmp_path / 'records.csv'
+    records.to_csv(source, index=False)
+
+    categories, total_rows = collect_categories(str(source), 100)
+    assert total_rows == 300
+    encoders = fit_label_encoders(categories)
+    for column, encoder in encoders.items():
+        assert list(encoder.classes_) == list(LabelEncoder().fit(records[column]).classes_)
+
+
+def test_leaf_size_grows_with_rows_and_trees():
+    node_bytes = forest_node_bytes(3)
+    # 100 trees of 1000 rows fit comfortably: every row can be its own leaf
+    assert leaf_size_within(100, 100, 1000, 3) == 1
+    # The worst case is 2 * rows / leaf nodes per tree
+    budget_mb = 10
+    leaf = leaf_size_within(budget_mb, 100, 50000, 3)
+    assert 100 * 2 * 50000 / leaf * node_bytes <= budget_mb * 2**20
+    assert 100 * 2 * 50000 / (leaf - 1) * node_bytes > budget_mb * 2**20
+
+
+def test_small_source_keeps_full_depth_trees(monkeypatch, tmp_path):
+    # The leaf size is worked out from the rows a tree really gets, not the --sample-rows cap
+    models = run_main(monkeypatch, tmp_path, make_records(600), '--memory-budget-mb', '1024')
+    for name in ('seed_size_model', 'sowing_depth_model', 'spacing_model'):
+        assert models[name].min_samples_leaf == 1
+        assert models[name].n_estimators == 100
+
+
+@pytest.mark.parametrize('n_estimators', [7, 25])
+def test_tree_count_matches_n_estimators(monkeypatch, tmp_path, n_estimators):
+    # 10 chunks: with 7 trees some chunks pool their samples, with 25 every chunk grows several trees
+    models = run_main(monkeypatch, tmp_path, make_records(1000), '--chunk-rows', '100',
+                      '--n-estimators', str(n_estimators))
+    assert models['seed_size_model'].n_estimators == n_estimators
+    assert len(models['sowing_depth_model'].estimators_) == n_estimators
+    assert len(models['spacing_model'].estimators_) == n_estimators
+    assert not (tmp_path / 'model_registry').exists()
@@ -0,0 +1,416 @@
+# Out-of-core training for datasets that don't fit in memory
+#
+# ml_model.py loads the whole workbook at once. This script produces the same artifacts
+# (agricultural_models.pkl, unique_values.pkl, similar_index.pkl and a registry version)
+# but only ever holds one chunk of the source in memory:
+#   1. First pass: stream the source and collect every category seen, so the label encoders
+#      are fitted on the union of categories (the same classes ml_model.py would get).
+#   2. Second pass: for each chunk, take a sample stratified by seed size category, train
+#      small forests on it and add their trees to one merged forest per target.
+# --n-estimators trees are spread over the chunks, so the merged forests have about as many
+# trees as ml_model.py's whatever the chunk size.
+#
+# The memory budget covers the whole process. What the interpreter and libraries use at start
+# is taken off first; the rest is split between the chunk being read, the training sample, the
+# rows kept for evaluation and the similar index, and the merged forests. The forests are kept
+# in their share by growing shallower trees (a larger min_samples_leaf). If memory still goes
+# over the budget, the chunk and sample sizes are halved for the rest of the run.
+#
+# A registry version is only published with --publish, and not if it scores below the version
+# being served on the held-out rows.
+#
+# Usage:
+#   python train_chunked.py --source field_records.csv --memory-budget-mb 1024 --publish
+import argparse
+import math
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import mean_squared_error, accuracy_score
+
+import model_registry
+from similar_plantings import build_similar_index, SIMILAR_INDEX_FILE, RESULT_COLUMNS
+
+FEATURE_COLUMNS = model_registry.FEATURE_COLUMNS
+CATEGORICAL_COLUMNS = model_registry.CATEGORICAL_COLUMNS
+SEED_SIZE_COLUMN = 'Seed Size Category'
+DEPTH_COLUMN = 'Sowing Depth (cm)'
+SPACING_COLUMN = 'Spacing Between Seeds (cm)'
+SOURCE_COLUMNS = FEATURE_COLUMNS + [SEED_SIZE_COLUMN, DEPTH_COLUMN, SPACING_COLUMN]
+
+# Shares of the memory left after start-up. The rest is headroom for the final evaluation.
+CHUNK_BUDGET_SHARE = 0.2  # one raw chunk and the copy that leaves out the held-out rows
+SAMPLE_BUDGET_SHARE = 0.15  # the rows a chunk's forests are trained on, plus scikit-learn's working copies
+TEST_BUDGET_SHARE = 0.05  # held-out evaluation rows, kept across chunks
+SIMILAR_BUDGET_SHARE = 0.1  # rows kept for the similar plantings index
+MODEL_BUDGET_SHARE = 0.4  # the merged forests (half of it, since pickling them makes a second copy)
+# Rows read to estimate how much memory one row takes
+PROBE_ROWS = 1000
+# Smallest chunk and sample the budget may shrink them to
+MIN_ROWS = 1000
+# scikit-learn copies the features to float32 and keeps per-row bootstrap weights and indices while fitting
+FIT_BYTES_PER_ROW = 200
+# One tree node: child/feature indices, threshold, impurity and sample counts (64 bytes),
+# plus 8 bytes per class (classifier) or per output (regressor) for the node's value
+NODE_BYTES = 64
+VALUE_BYTES = 8
+
+
+def current_rss_mb():
+    """Resident memory of this process right now (Linux), falling back to the peak"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Highest resident memory of this process so far, or None where it can't be measured"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def read_chunks(source, chunk_rows):
+    """Yield DataFrames of at most chunk_rows rows with the training columns
+
+    chunk_rows may also be a function, asked again before every chunk, so the size can shrink mid-run
+    """
+    def size():
+        return chunk_rows() if callable(chunk_rows) else chunk_rows
+
+    if source.lower().endswith('.csv'):
+        reader = pd.read_csv(source, usecols=SOURCE_COLUMNS, chunksize=size())
+        try:
+            while True:
+                try:
+                    yield reader.get_chunk(size())
+                except StopIteration:
+                    return
+        finally:
+            reader.close()
+
+    # Excel: read row by row without loading the whole workbook
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = list(next(rows))
+        positions = [header.index(column) for column in SOURCE_COLUMNS]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append([row[p] for p in positions])
+            if len(batch) >= size():
+                yield pd.DataFrame(batch, columns=SOURCE_COLUMNS)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=SOURCE_COLUMNS)
+    finally:
+        workbook.close()
+
+
+def estimate_row_bytes(source):
+    """Memory one row of the source takes once loaded into a DataFrame"""
+    probe = next(read_chunks(source, PROBE_ROWS))
+    return probe.memory_usage(deep=True).sum() / max(1, len(probe))
+
+
+def rows_within(memory_budget_mb, share, row_bytes):
+    """How many rows fit into a share of the memory budget"""
+    return int(memory_budget_mb * 2**20 * share / row_bytes)
+
+
+def forest_node_bytes(n_classes):
+    """Bytes one node costs across the three forests (seed size classifier, depth and spacing regressors)"""
+    return (NODE_BYTES + VALUE_BYTES * n_classes) + 2 * (NODE_BYTES + VALUE_BYTES)
+
+
+def leaf_size_within(model_budget_mb, n_estimators, sample_rows, n_classes):
+    """Smallest min_samples_leaf that keeps the three merged forests inside their budget
+
+    A tree whose leaves hold at least L of its n training rows has at most 2n/L nodes.
+    """
+    worst_case_bytes = n_estimators * 2 * sample_rows * forest_node_bytes(n_classes)
+    return max(1, math.ceil(worst_case_bytes / (model_budget_mb * 2**20)))
+
+
+def forest_mb(forests):
+    """Memory the fitted trees' node and value arrays take"""
+    return sum(tree.tree_.node_count * (NODE_BYTES + tree.tree_.value[0].size * VALUE_BYTES)
+               for forest in forests for tree in forest.estimators_) / 2**20
+
+
+def collect_categories(source, chunk_rows):
+    """First pass: every category per column (in order of first appearance), row and class counts"""
+    categories = {column: {} for column in CATEGORICAL_COLUMNS + [SEED_SIZE_COLUMN]}
+    total_rows = 0
+    for chunk in read_chunks(source, chunk_rows):
+        total_rows += len(chunk)
+        for column, seen in categories.items():
+            for value in chunk[column].unique():
+                seen.setdefault(value, None)
+    return {column: list(seen) for column, seen in categories.items()}, total_rows
+
+
+def fit_label_encoders(categories):
+    """LabelEncoder sorts its classes, so fitting on the union gives the same encoding as fitting on all rows"""
+    label_encoders = {}
+    for column, values in categories.items():
+        le = LabelEncoder()
+        le.fit(values)
+        label_encoders[column] = le
+    return label_encoders
+
+
+def stratified_sample(chunk, target_rows, random_state):
+    """Take about target_rows rows, keeping the seed size category mix of the chunk"""
+    if len(chunk) <= target_rows:
+        return chunk
+    fraction = target_rows / len(chunk)
+    return chunk.groupby(SEED_SIZE_COLUMN).sample(frac=fraction, random_state=random_state)
+
+
+def merge_forests(forests):
+    """Join the trees of several fitted forests into the first one"""
+    merged = forests[0]
+    for forest in forests[1:]:
+        merged.estimators_ += forest.estimators_
+    merged.n_estimators = len(merged.estimators_)
+    return merged
+
+
+def form_inputs(rows):
+    """Turn DataFrame rows into the form-style inputs the app and the registry use"""
+    return [{
+        'crop_name': row['Crop Name'],
+        'region': row['Region'],
+        'season': row['Season'],
+        'temperature': float(row['Temperature (°C)']),
+        'moisture': float(row['Moisture (%)']),
+        'soil_type': row['Soil Type'],
+        'soil_ph': float(row['Soil pH'])
+    } for _, row in rows.iterrows()]
+
+
+def served_version_accuracy(test):
+    """Seed size accuracy of the registry's current version on the held-out rows
+
+    None when nothing is served yet, or when the served encoders don't know a category in these rows.
+    """
+    registry_dir = model_registry.REGISTRY_DIR_NAME
+    version = model_registry.get_current_version(registry_dir)
+    if version is None:
+        return None
+    served = model_registry.load_version(registry_dir, version)['models']
+    try:
+        predictions = model_registry.predict_with_models(served, form_inputs(test))
+    except ValueError as e:
+        print(f"Served version {version} can't score the held-out rows ({e}); not comparing")
+        return None
+    accuracy = accuracy_score(test[SEED_SIZE_COLUMN].astype(str), [p['seed_size'] for p in predictions])
+    print(f"Served version {version} accuracy on the same rows: {accuracy:.4f}")
+    return accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the seed models chunk by chunk")
+    parser.add_argument('--source', default='Maharashtra_Agriculture_Realistic.xlsx',
+                        help="training data (.xlsx or .csv) with the same columns as the workbook")
+    parser.add_argument('--memory-budget-mb', type=float, default=1024,
+                        help="memory the whole process should stay under, including the Python interpreter")
+    parser.add_argument('--chunk-rows', type=int, help="rows per chunk (default and cap: derived from the memory budget)")
+    parser.add_argument('--sample-rows', type=int, default=50000,
+                        help="cap on rows per chunk the forests are trained on (lowered to fit the memory budget)")
+    parser.add_argument('--n-estimators', type=int, default=100,
+                        help="trees per forest in total, spread over the chunks (same default as ml_model.py)")
+    parser.add_argument('--min-samples-leaf', type=int, default=1,
+                        help="smallest leaf size (raised if the forests would not fit the memory budget)")
+    parser.add_argument('--test-fraction', type=float, default=0.2, help="share of rows held out for evaluation")
+    parser.add_argument('--max-test-rows', type=int, default=100000, help="cap on held-out rows")
+    parser.add_argument('--similar-rows', type=int, default=200000,
+                        help="cap on rows kept for the similar plantings index")
+    parser.add_argument('--publish', action='store_true',
+                        help="publish a registry version, unless it scores below the served version on the held-out rows")
+    parser.add_argument('--force-publish', action='store_true',
+                        help="with --publish, publish even if the served version scores better")
+    args = parser.parse_args()
+
+    # The interpreter, pandas and scikit-learn already take part of the budget
+    startup_mb = current_rss_mb() or 0.0
+    usable_mb = args.memory_budget_mb - startup_mb
+    if usable_mb < 0.25 * args.memory_budget_mb:
+        sys.exit(f"A {args.memory_budget_mb:.0f} MB budget leaves only {max(0, usable_mb):.0f} MB for training: "
+                 f"Python and its libraries already use {startup_mb:.0f} MB. Raise --memory-budget-mb.")
+
+    rng = np.random.default_rng(42)
+    row_bytes = estimate_row_bytes(args.source)
+    chunk_rows = max(MIN_ROWS, rows_within(usable_mb, CHUNK_BUDGET_SHARE, 2 * row_bytes))
+    if args.chunk_rows:
+        chunk_rows = min(args.chunk_rows, chunk_rows)
+    sample_rows = max(MIN_ROWS, min(args.sample_rows, rows_within(usable_mb, SAMPLE_BUDGET_SHARE,
+                                                                  row_bytes + FIT_BYTES_PER_ROW)))
+    print(f"Memory budget {args.memory_budget_mb:.0f} MB ({startup_mb:.0f} MB used at start), "
+          f"reading {chunk_rows} rows per chunk, training on up to {sample_rows}")
+
+    # Pass 1: categories and row counts
+    categories, total_rows = collect_categories(args.source, chunk_rows)
+    label_encoders = fit_label_encoders(categories)
+    n_seed_sizes = len(label_encoders[SEED_SIZE_COLUMN].classes_)
+    print(f"Found {total_rows} rows; categories: "
+          + ", ".join(f"{column} {len(values)}" for column, values in categories.items()))
+
+    # Rows are held out / kept for the similar index at random, sized so both stay bounded
+    max_test_rows = min(args.max_test_rows, rows_within(usable_mb, TEST_BUDGET_SHARE, row_bytes))
+    max_similar_rows = min(args.similar_rows, rows_within(usable_mb, SIMILAR_BUDGET_SHARE, row_bytes))
+    test_probability = min(args.test_fraction, max_test_rows / max(1, total_rows))
+    similar_probability = min(1.0, max_similar_rows / max(1, total_rows))
+
+    # Rows one tree is trained on: a chunk's sample, or the pooled samples of several chunks when
+    # there are more chunks than trees, but never more than the source has once the held-out rows
+    # are taken out. Chunks and samples only ever shrink from here, so this leaf size keeps the
+    # merged forests inside their share for the whole run.
+    chunks_per_tree = math.ceil(math.ceil(total_rows / chunk_rows) / max(1, args.n_estimators))
+    group_rows = min(total_rows, chunk_rows * max(1, chunks_per_tree))
+    tree_rows = min(sample_rows, math.ceil(group_rows * (1 - test_probability)))
+    min_samples_leaf = max(args.min_samples_leaf,
+                           leaf_size_within(usable_mb * MODEL_BUDGET_SHARE / 2, args.n_estimators,
+                                            tree_rows, n_seed_sizes))
+    if min_samples_leaf > args.min_samples_leaf:
+        print(f"Growing trees with min_samples_leaf={min_samples_leaf} to keep the forests in the memory budget")
+
+    # Pass 2: train on each chunk and merge the trees
+    seed_size_forests, depth_forests, spacing_forests = [], [], []
+    test_parts, similar_parts = [], []
+    skipped_classifier_chunks = 0
+    rows_left = total_rows
+    trees_left = args.n_estimators
+
+    group = []  # samples of the chunks that will share the next trees
+    for number, chunk in enumerate(read_chunks(args.source, lambda: chunk_rows), start=1):
+        chunks_left = max(1, math.ceil(rows_left / chunk_rows))
+        if not group:
+            # With more chunks than trees left, several chunks pool their samples for one tree
+            group_size = max(1, math.ceil(chunks_left / max(1, trees_left)))
+        rows_left -= len(chunk)
+
+        held_out = rng.random(len(chunk)) < test_probability
+        test_parts.append(chunk[held_out])
+        similar_parts.append(chunk[rng.random(len(chunk)) < similar_probability][RESULT_COLUMNS])
+        group.append(stratified_sample(chunk[~held_out], max(1, sample_rows // group_size), random_state=number))
+        del chunk
+        if len(group) < group_size and rows_left > 0:
+            continue
+
+        # Spread the remaining trees over the chunks still to come (their size may have changed)
+        trees = 1 if group_size > 1 else max(1, math.ceil(trees_left / chunks_left))
+        trees_left -= trees
+        train = pd.concat(group, ignore_index=True) if len(group) > 1 else group[0]
+        group = []
+
+        X = train[FEATURE_COLUMNS].copy()
+        for column in CATEGORICAL_COLUMNS:
+            X[column] = label_encoders[column].transform(X[column])
+        y_seed_size = label_encoders[SEED_SIZE_COLUMN].transform(train[SEED_SIZE_COLUMN])
+
+        def forest(model_class):
+            return model_class(n_estimators=trees, min_samples_leaf=min_samples_leaf, random_state=number)
+
+        # Trees from different chunks can only be merged if they know the same seed size classes
+        if len(np.unique(y_seed_size)) == n_seed_sizes:
+            seed_size_forests.append(forest(RandomForestClassifier).fit(X, y_seed_size))
+        else:
+            skipped_classifier_chunks += 1
+        depth_forests.append(forest(RandomForestRegressor).fit(X, train[DEPTH_COLUMN]))
+        spacing_forests.append(forest(RandomForestRegressor).fit(X, train[SPACING_COLUMN]))
+
+        rss = current_rss_mb()
+        print(f"Chunk {number}: {trees} tree(s) on {len(train)} rows, "
+              f"forests {forest_mb(seed_size_forests + depth_forests + spacing_forests):.1f} MB, memory {rss:.0f} MB")
+        if rss is not None and rss > args.memory_budget_mb and (sample_rows > MIN_ROWS or chunk_rows > MIN_ROWS):
+            sample_rows = max(min(MIN_ROWS, sample_rows), sample_rows // 2)
+            chunk_rows = max(min(MIN_ROWS, chunk_rows), chunk_rows // 2)
+            print(f"  Over the memory budget, reading {chunk_rows} and training on {sample_rows} rows per chunk from now on")
+        del train, X
+
+    if not seed_size_forests:
+        sys.exit("No chunk contained every seed size category; use larger chunks or --sample-rows")
+    if skipped_classifier_chunks:
+        print(f"Seed size trees skipped for {skipped_classifier_chunks} chunk(s) missing a category")
+
+    seed_size_model = merge_forests(seed_size_forests)
+    sowing_depth_model = merge_forests(depth_forests)
+    spacing_model = merge_forests(spacing_forests)
+    del seed_size_forests, depth_forests, spacing_forests
+
+    # Evaluate on the held-out rows
+    test = pd.concat(test_parts, ignore_index=True)
+    del test_parts
+    if len(test):
+        X_test = test[FEATURE_COLUMNS].copy()
+        for column in CATEGORICAL_COLUMNS:
+            X_test[column] = label_encoders[column].transform(X_test[column])
+        y_seed_size_test = label_encoders[SEED_SIZE_COLUMN].transform(test[SEED_SIZE_COLUMN])
+        accuracy = accuracy_score(y_seed_size_test, seed_size_model.predict(X_test))
+        print(f"Seed Size Classification Accuracy: {accuracy:.4f}")
+        depth_rmse = np.sqrt(mean_squared_error(test[DEPTH_COLUMN], sowing_depth_model.predict(X_test)))
+        print(f"Sowing Depth RMSE: {depth_rmse:.4f} cm")
+        spacing_rmse = np.sqrt(mean_squared_error(test[SPACING_COLUMN], spacing_model.predict(X_test)))
+        print(f"Spacing RMSE: {spacing_rmse:.4f} cm")
+
+    # Save the same artifacts as ml_model.py
+    models = {
+        'seed_size_model': seed_size_model,
+        'sowing_depth_model': sowing_depth_model,
+        'spacing_model': spacing_model,
+        'label_encoders': label_encoders
+    }
+    with open('agricultural_models.pkl', 'wb') as f:
+        pickle.dump(models, f)
+
+    unique_values = {column: categories[column] for column in CATEGORICAL_COLUMNS}
+    with open('unique_values.pkl', 'wb') as f:
+        pickle.dump(unique_values, f)
+
+    similar_index = build_similar_index(pd.concat(similar_parts, ignore_index=True))
+    del similar_parts
+    with open(SIMILAR_INDEX_FILE, 'wb') as f:
+        pickle.dump(similar_index, f)
+
+    print(f"\nModels saved to 'agricultural_models.pkl' "
+          f"({os.path.getsize('agricultural_models.pkl') / 2**20:.1f} MB, "
+          f"{seed_size_model.n_estimators} trees per forest)")
+    print(f"Similar plantings index ({len(similar_index)} rows) saved to '{SIMILAR_INDEX_FILE}'")
+
+    if args.publish:
+        # The golden inputs only show the saved models reproduce themselves, so the held-out rows
+        # are also scored with the version being served; a worse model is not published over it
+        served_accuracy = served_version_accuracy(test) if len(test) else None
+        if served_accuracy is not None and not args.force_publish and accuracy < served_accuracy:
+            sys.exit(f"Not published: accuracy {accuracy:.4f} on the held-out rows is below the served "
+                     f"version's {served_accuracy:.4f} (use --force-publish to publish anyway)")
+        golden_inputs = model_registry.make_golden_inputs(models, form_inputs(test.head(20)))
+        version = model_registry.publish_version(model_registry.REGISTRY_DIR_NAME, models, unique_values,
+                                                 golden_inputs, extra_files={SIMILAR_INDEX_FILE: similar_index})
+        print(f"Models published to '{model_registry.REGISTRY_DIR_NAME}' as version {version}")
+
+    peak = peak_rss_mb()
+    if peak is not None:
+        status = "within" if peak <= args.memory_budget_mb else "OVER"
+        print(f"Peak memory {peak:.0f} MB ({status} the {args.memory_budget_mb:.0f} MB budget)")
+
+
+if __name__ == '__main__':
+    main()